@@ -2,12 +2,11 @@
 
 import pandas as pd
 import pytest
-from lxml import etree
 
 from unify_idents.engine_parsers.ident.comet_2020_01_4_parser import (
     Comet_2020_01_4_Parser,
-    _get_single_spec_df,
 )
+from unify_idents.engine_parsers.mzid_reader import MzidReader, results_to_df
 
 
 def test_engine_parsers_comet_init():
@@ -106,13 +105,8 @@ def test_engine_parsers_comet_check_dataframe_integrity():
     assert (df["raw_data_location"] == "path/for/glory.mzML").all()
 
 
-def test_get_single_spec_df_comet():
+def test_mzid_reader_records_comet():
     input_file = pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
-    element = (
-        etree.parse(input_file)
-        .getroot()
-        .find(".//{*}SpectrumIdentificationList/{*}SpectrumIdentificationResult")
-    )
     ref_dict = {
         "exp_mz": None,
         "calc_mz": None,
@@ -144,9 +138,8 @@ def test_get_single_spec_df_comet():
         "number of matched peaks": "comet:num_matched_ions",
         "number of unmatched peaks": "comet:num_unmatched_ions",
     }
-    _get_single_spec_df.reference_dict = ref_dict
-    _get_single_spec_df.mapping_dict = mapping_dict
-    result = _get_single_spec_df(etree.tostring(element))
+    batch = next(MzidReader(input_file).iter_result_batches(mapping_dict, batch_size=1))
+    result = results_to_df([batch], ref_dict, mapping_dict, spectrum_id_from_ref=True)
 
     assert isinstance(result, pd.DataFrame)
     assert (
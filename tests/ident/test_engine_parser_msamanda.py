@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import pandas as pd
 import pytest
 
 from unify_idents.engine_parsers.ident.msamanda_2_parser import MSAmanda_2_Parser
@@ -129,5 +130,18 @@ def test_map_mod_translation_msamanda():
             ],
         },
     )
-    converted = parser._map_mod_translation(row=["C3(Carbamidomethyl|57.021464|fixed)"])
-    assert converted == "Carbamidomethyl:3;"
+    parser.df = pd.DataFrame(
+        {
+            "modifications": [
+                "C3(Carbamidomethyl|57.021464|fixed)",
+                None,
+                "N-Term(Acetyl|42.010565|variable);C10(Carbamidomethyl|57.021464|fixed)",
+            ]
+        }
+    )
+    converted = parser.translate_mods()
+    assert converted.to_list() == [
+        "Carbamidomethyl:3",
+        "",
+        "Acetyl:0;Carbamidomethyl:10",
+    ]
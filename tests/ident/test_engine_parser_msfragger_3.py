@@ -1,6 +1,11 @@
+import pandas as pd
 import pytest
 
-from unify_idents.engine_parsers.ident.msfragger_3_parser import MSFragger_3_Parser
+from unify_idents.engine_parsers.ident.msfragger_3_parser import (
+    COLUMN_DTYPES,
+    MSFragger_3_Parser,
+)
+from unify_idents.engine_parsers.table_reader import read_table
 
 
 def test_engine_parsers_msfragger_init():
@@ -135,8 +140,34 @@ def test_map_mod_translation_msfragger3():
             "15N": False,
         },
     )
-    map_dict = {"15.994915": ["Oxidation"], "57.021465": ["Carbamidomethyl"]}
-    converted = parser._map_mod_translation(
-        row=["3M(15.994915)", "15M(15.994915)", "18C(57.021465)"], map_dict=map_dict
+    map_dict = {
+        "15.994915": ["Oxidation"],
+        "57.021465": ["Carbamidomethyl"],
+        "42.010567": ["Acetyl"],
+        "79.966331": [],
+    }
+    parser.df = pd.DataFrame(
+        {
+            "modifications": [
+                "3M(15.994915), 15M(15.994915), 18C(57.021465)",
+                None,
+                "N-term(42.010567), 2C(57.021465)",
+                "3S(79.966331), 18C(57.021465)",
+            ]
+        }
     )
-    assert converted == "Oxidation:3;Oxidation:15;Carbamidomethyl:18;"
+    converted = parser._map_mod_translations(parser._split_mods(), map_dict=map_dict)
+    assert converted.to_list() == [
+        "Oxidation:3;Oxidation:15;Carbamidomethyl:18",
+        "",
+        "Acetyl:0;Carbamidomethyl:2",
+        "NON_MAPPABLE",
+    ]
+
+
+def test_msfragger_column_dtypes_keep_input_values():
+    input_file = pytest._test_path / "data" / "BSA1_msfragger_3.tsv"
+    expected = pd.read_csv(input_file, delimiter="\t")
+    df = read_table(input_file, delimiter="\t", dtypes=COLUMN_DTYPES)
+    for column in ["hyperscore", "nextscore", "expectscore", "massdiff"]:
+        assert df[column].to_list() == expected[column].to_list()
@@ -1,12 +1,11 @@
 #!/usr/bin/env python
 import pandas as pd
 import pytest
-from lxml import etree
 
 from unify_idents.engine_parsers.ident.msgfplus_2021_03_22_parser import (
     MSGFPlus_2021_03_22_Parser,
-    _get_single_spec_df,
 )
+from unify_idents.engine_parsers.mzid_reader import MzidReader, results_to_df
 
 
 def test_engine_parsers_msgfplus_init():
@@ -149,11 +148,8 @@ def test_engine_parsers_msgfplus_get_peptide_lookup():
     assert lookup["Pep_YICDNQDTISSK"]["modifications"] == "Carbamidomethyl:3"
 
 
-def test_get_single_spec_df_msgf():
+def test_mzid_reader_records_msgf():
     input_file = pytest._test_path / "data" / "BSA1_msgfplus_2021_03_22.mzid"
-    element = (
-        etree.parse(input_file).getroot().find(".//{*}SpectrumIdentificationResult")
-    )
     ref_dict = {
         "exp_mz": None,
         "calc_mz": None,
@@ -183,9 +179,12 @@ def test_get_single_spec_df_msgf():
         "spectrum title": "spectrum_title",
         "NumMatchedMainIons": "ms-gf:num_matched_ions",
     }
-    _get_single_spec_df.reference_dict = ref_dict
-    _get_single_spec_df.mapping_dict = mapping_dict
-    result = _get_single_spec_df(etree.tostring(element))
+    batch = next(
+        MzidReader(input_file).iter_result_batches(
+            mapping_dict, batch_size=1, spectrum_params=True, user_params=True
+        )
+    )
+    result = results_to_df([batch], ref_dict, mapping_dict)
 
     assert isinstance(result, pd.DataFrame)
     assert (
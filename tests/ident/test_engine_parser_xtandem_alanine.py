@@ -1,14 +1,23 @@
 #!/usr/bin/env python
 
+import shutil
+
 import numpy as np
 import pandas as pd
 import pytest
 from lxml import etree
 
+import unify_idents.engine_parsers.ident.xtandem_alanine as xtandem_alanine
 from unify_idents.engine_parsers.ident.xtandem_alanine import (
     XTandemAlanine_Parser,
-    _get_single_spec_df,
+    _get_indexed_spec_batch,
+    _get_spec_batch,
+    _mp_specs_init,
+    iter_spectrum_batches,
+    read_xtandem_version,
 )
+from unify_idents.engine_parsers.psm_batch import batches_to_df
+from unify_idents.engine_parsers.xml_index import get_xml_index
 
 
 def test_engine_parsers_xtandem_init():
@@ -118,7 +127,60 @@ def test_engine_parsers_xtandem_check_dataframe_integrity():
     assert df["modifications"].str.count(":").sum() == 50
 
 
-def test_get_single_spec_df():
+@pytest.mark.parametrize(
+    "read_params",
+    [{"xml_streaming": True, "xml_index": False}, {"xml_index": True}],
+)
+def test_engine_parsers_xtandem_streaming_matches_tree(tmp_path, read_params):
+    input_file = tmp_path / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
+    shutil.copy(
+        pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml",
+        input_file,
+    )
+    params = {
+        "cpus": 2,
+        "rt_pickle_name": pytest._test_path / "data" / "_ursgal_lookup.csv",
+        "database": pytest._test_path / "data" / "test_Creinhardtii_target_decoy.fasta",
+        "enzyme": "(?<=[KR])(?![P])",
+        "terminal_cleavage_site_integrity": "any",
+        "validation_score_field": {"xtandem_alanine": "x!tandem:hyperscore"},
+        "bigger_scores_better": {"xtandem_alanine": True},
+        "modifications": [
+            {"aa": "M", "type": "opt", "position": "any", "name": "Oxidation"},
+            {"aa": "C", "type": "fix", "position": "any", "name": "Carbamidomethyl"},
+        ],
+    }
+    tree_df = XTandemAlanine_Parser(
+        input_file, params={**params, "xml_streaming": False, "xml_index": False}
+    ).unify()
+    parser = XTandemAlanine_Parser(input_file, params={**params, **read_params})
+    assert parser.root is None
+    stream_df = parser.unify()
+    assert parser.root is None
+    pd.testing.assert_frame_equal(stream_df, tree_df)
+
+
+def test_iter_spectrum_batches():
+    input_file = (
+        pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
+    )
+    spectra = [
+        etree.tostring(e) for e in etree.parse(input_file).getroot() if "z" in e.attrib
+    ]
+    batches = list(iter_spectrum_batches(input_file, batch_size=10))
+    assert [len(b) for b in batches] == [10] * 7 + [6]
+    assert [s for b in batches for s in b] == spectra
+
+
+def test_read_xtandem_version(monkeypatch):
+    input_file = pytest._test_path / "data" / "BSA1_xtandem_alanine.xml"
+    assert read_xtandem_version(input_file) == "X! Tandem Alanine (2017.2.1.4)"
+    # Falls back to streaming if the version is not in the file tail
+    monkeypatch.setattr(xtandem_alanine, "VERSION_TAIL_BYTES", 10)
+    assert read_xtandem_version(input_file) == "X! Tandem Alanine (2017.2.1.4)"
+
+
+def test_get_spec_batch():
     input_file = (
         pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
     )
@@ -154,9 +216,8 @@ def test_get_single_spec_df():
         "hyperscore": "x!tandem:hyperscore",
     }
 
-    _get_single_spec_df.reference_dict = ref_dict
-    _get_single_spec_df.mapping_dict = mapping_dict
-    result = _get_single_spec_df(etree.tostring(element))
+    _mp_specs_init(_get_spec_batch, ref_dict, mapping_dict)
+    result = batches_to_df([_get_spec_batch([etree.tostring(element)])])
 
     assert isinstance(result, pd.DataFrame)
     assert (
@@ -186,6 +247,26 @@ def test_get_single_spec_df():
     ).all()
 
 
+def test_get_indexed_spec_batch_matches_spec_batch(tmp_path):
+    input_file = tmp_path / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
+    shutil.copy(
+        pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml",
+        input_file,
+    )
+    ref_dict = {"search_engine": "xtandem_alanine", "spectrum_id": None}
+    mapping_dict = {"seq": "sequence", "z": "charge"}
+    _mp_specs_init(_get_spec_batch, ref_dict, mapping_dict)
+    _mp_specs_init(_get_indexed_spec_batch, ref_dict, mapping_dict)
+    index = get_xml_index(input_file, "group", attribute="z")
+    spectra = [etree.tostring(e) for e in etree.parse(str(input_file)).getroot()]
+
+    batch = _get_indexed_spec_batch(
+        str(input_file), index["namespaces"], index["encoding"], index["offsets"]
+    )
+    assert batch == _get_spec_batch(spectra)
+    assert len(batch["sequence"]) == 79
+
+
 def test_engine_parsers_xtandem_nterminal_mod():
     input_file = (
         pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
@@ -376,3 +457,39 @@ def test_engine_parsers_xtandem_map_mod_names_nterm():
         "Carbamidomethyl:1",
         "Acetyl:0",
     }
+
+
+def test_engine_parsers_xtandem_map_mod_names_exact_positions():
+    input_file = (
+        pytest._test_path / "data" / "test_Creinhardtii_QE_pH11_xtandem_alanine.xml"
+    )
+    parser = XTandemAlanine_Parser(
+        input_file,
+        params={
+            "cpus": 2,
+            "enzyme": "(?<=[KR])(?![P])",
+            "terminal_cleavage_site_integrity": "any",
+            "validation_score_field": {"xtandem_alanine": "x!tandem:hyperscore"},
+            "bigger_scores_better": {"xtandem_alanine": True},
+            "modifications": [
+                {
+                    "aa": "C",
+                    "type": "fix",
+                    "position": "any",
+                    "name": "Carbamidomethyl",
+                },
+            ],
+        },
+    )
+    df = pd.DataFrame(
+        {
+            "modifications": [["57.021464:10"], [], ["57.021464:1", "57.021464:1"]],
+            "sequence": ["ACDEFGHIKLCR", "PEPTIDE", "ACK"],
+        }
+    )
+    # 57.021464:1 must not match 57.021464:10
+    assert parser.map_mod_names(df)["modifications"].to_list() == [
+        "Carbamidomethyl:11",
+        "",
+        "Carbamidomethyl:2",
+    ]
@@ -0,0 +1,137 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from unify_idents.daemon import (
+    SpoolWatcher,
+    UnifyService,
+    make_http_server,
+    make_unix_server,
+    write_dataframe,
+)
+from unify_idents.executor import UnifyExecutor
+
+
+class RecordingService(UnifyService):
+    def __init__(self, output_root):
+        super().__init__(executor=UnifyExecutor(max_workers=1), output_root=output_root)
+        self.jobs = []
+
+    def run_job(self, job):
+        self.jobs.append(job)
+        write_dataframe(pd.DataFrame({"sequence": ["PEPTIDE"]}), job["output_file"])
+        return {"status": "ok", "output_file": job["output_file"], "rows": 1}
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_write_dataframe(tmp_path):
+    df = pd.DataFrame({"sequence": ["PEPTIDE", "PEPTIDER"], "charge": [2, 3]})
+    write_dataframe(df, tmp_path / "out" / "result.tsv")
+    assert pd.read_csv(tmp_path / "out" / "result.tsv", sep="\t").equals(df)
+    assert [f.name for f in (tmp_path / "out").iterdir()] == ["result.tsv"]
+
+
+def test_service_reports_failed_jobs(tmp_path):
+    service = UnifyService(executor=UnifyExecutor(max_workers=1), output_root=tmp_path)
+    result = service.handle(
+        {
+            "input_file": str(tmp_path / "missing.tsv"),
+            "output_file": str(tmp_path / "out.csv"),
+        }
+    )
+    assert result["status"] == "error"
+    assert "FileNotFoundError" in result["error"]
+    assert service.handle({"input_file": "a.tsv"})["status"] == "error"
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_service_rejects_unsafe_jobs(tmp_path):
+    service = RecordingService(tmp_path / "results")
+    job = {"input_file": "in.tsv", "output_file": str(tmp_path / "out.csv")}
+    assert "inside" in service.handle(job)["error"]
+    job["output_file"] = str(tmp_path / "results" / ".." / "out.csv")
+    assert "inside" in service.handle(job)["error"]
+    job["output_file"] = str(tmp_path / "results" / "out.csv")
+    job["params"] = {"database": "other.fasta", "max_rank": 1}
+    assert "database" in service.handle(job)["error"]
+    assert service.jobs == []
+    job["params"] = {"max_rank": 1}
+    assert service.handle(job)["status"] == "ok"
+
+
+def test_unix_socket_jobs(tmp_path):
+    service = RecordingService(tmp_path)
+    server = make_unix_server(service, tmp_path / "unify.sock")
+    _serve(server)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(tmp_path / "unify.sock"))
+            f = client.makefile("rwb")
+            job = {"input_file": "in.tsv", "output_file": str(tmp_path / "out.csv")}
+            f.write(json.dumps(job).encode() + b"\n" + b"not json\n")
+            f.flush()
+            assert json.loads(f.readline())["status"] == "ok"
+            assert json.loads(f.readline())["status"] == "error"
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert service.jobs == [job]
+    assert (tmp_path / "out.csv").exists()
+
+
+def test_http_jobs(tmp_path):
+    service = RecordingService(tmp_path)
+    server = make_http_server(service, port=0)
+    _serve(server)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/health") as response:
+            assert json.load(response) == {"status": "ok"}
+        job = {"input_file": "in.tsv", "output_file": str(tmp_path / "out.csv")}
+        request = urllib.request.Request(
+            f"{url}/jobs", data=json.dumps(job).encode(), method="POST"
+        )
+        request.add_header("Content-Type", "text/plain")
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(request)
+        assert e.value.code == 415
+        request.add_header("Content-Type", "application/json")
+        with urllib.request.urlopen(request) as response:
+            assert json.load(response)["rows"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert service.jobs == [job]
+
+
+def test_spool_watcher_waits_for_settled_files(tmp_path):
+    service = RecordingService(tmp_path)
+    watcher = SpoolWatcher(service, tmp_path, tmp_path / "results")
+    input_file = tmp_path / "BSA1_msfragger_3.tsv"
+    input_file.write_text("scannum\thyperscore\n")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert watcher.poll() == []
+    results = watcher.poll()
+    assert [r["output_file"] for r in results] == [
+        str(tmp_path / "results" / "BSA1_msfragger_3.tsv_unified.csv")
+    ]
+    assert watcher.poll() == []
+
+    # Outputs in the spool directory are not picked up again
+    watcher.output_dir = None
+    input_file.write_text("scannum\thyperscore\n1\t2\n")
+    watcher.poll()
+    watcher.poll()
+    assert watcher.poll() == []
+    assert len(service.jobs) == 2
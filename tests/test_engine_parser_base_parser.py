@@ -1,6 +1,13 @@
+import json
+
 import pytest
 
-from unify_idents.engine_parsers.base_parser import BaseParser
+import unify_idents.engine_parsers.base_parser as base_parser
+from unify_idents.engine_parsers.base_parser import (
+    BaseParser,
+    _uparma_cache_version,
+    get_header_translations,
+)
 
 
 def test_uninitialized_parser_compatiblity_is_false():
@@ -9,3 +16,39 @@ def test_uninitialized_parser_compatiblity_is_false():
     )
     compat = BaseParser.check_parser_compatibility(input_file)
     assert compat is False
+
+
+def test_base_parser_init_does_not_load_uparma():
+    parser = BaseParser(input_file=None, params=None)
+    assert parser._param_mapper is None
+
+
+def test_get_header_translations_reads_disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(base_parser, "_header_translations", {})
+    cache_file = tmp_path / f"uparma_header_translations_{_uparma_cache_version()}.json"
+    with open(cache_file, "w") as f:
+        json.dump({"test_style_1": {"sequence": "peptide", "charge": "z"}}, f)
+
+    translations = get_header_translations("test_style_1")
+    assert translations == {"sequence": "peptide", "charge": "z"}
+    assert get_header_translations("test_style_1") is translations
+
+    parser = BaseParser(input_file=None, params=None)
+    parser.style = "test_style_1"
+    assert parser._get_mapping_dict() == {"peptide": "sequence", "z": "charge"}
+    assert parser._param_mapper is None
+
+
+def test_get_header_translations_without_writable_cache(tmp_path, monkeypatch):
+    not_a_dir = tmp_path / "cache"
+    not_a_dir.write_text("")
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(not_a_dir / "unify_idents"))
+    monkeypatch.setattr(base_parser, "_header_translations", {})
+
+    class ParamMapper:
+        def get_default_params(self, style):
+            return {"header_translations": {"translated_value": {"sequence": "p"}}}
+
+    monkeypatch.setattr(base_parser, "get_param_mapper", ParamMapper)
+    assert get_header_translations("test_style_1") == {"sequence": "p"}
@@ -0,0 +1,42 @@
+import pytest
+
+from unify_idents.engine_parsers.dat_index import build_dat_index, index_sections
+from unify_idents.engine_parsers.xml_index import read_slices
+
+
+def test_index_sections():
+    data = (
+        b"MIME-Version: 1.0 (Generated by Mascot version 1.0)\r\n"
+        b"Content-Type: multipart/mixed; boundary=gc0p4Jq0M2Yt08jU534c0p\r\n"
+        b"\r\n--gc0p4Jq0M2Yt08jU534c0p\r\n"
+        b'Content-Type: application/x-Mascot; name="header"\r\n'
+        b"\r\nversion=2.6.2\r\n"
+        b"\r\n--gc0p4Jq0M2Yt08jU534c0p\r\n"
+        b'Content-Type: application/x-Mascot; name="query1"\r\n'
+        b"\r\ntitle=BSA1\r\n"
+        b"\r\n--gc0p4Jq0M2Yt08jU534c0p--\r\n"
+    )
+    sections = index_sections(data)
+    assert list(sections) == ["header", "query1"]
+    assert [data[start:end] for start, end in sections.values()] == [
+        b"\r\nversion=2.6.2\r\n",
+        b"\r\ntitle=BSA1\r\n",
+    ]
+
+
+@pytest.mark.parametrize("line_break", [b"\n", b"\r\n"])
+def test_build_dat_index(tmp_path, line_break):
+    input_file = tmp_path / "BSA1_mascot_2_6_2.dat"
+    input_file.write_bytes(
+        (pytest._test_path / "data" / "BSA1_mascot_2_6_2.dat")
+        .read_bytes()
+        .replace(b"\n", line_break)
+    )
+    sections = build_dat_index(input_file)
+    assert len([name for name in sections if name.startswith("query")]) == 1120
+    assert {"masses", "header", "peptides"} <= set(sections)
+    (query,) = read_slices(input_file, [sections["query1"]])
+    assert query.startswith(
+        b"\ntitle=BSA1%2e3538%2e3538%2e2\nscans=3538\n".replace(b"\n", line_break)
+    )
+    assert query.endswith(b",330.988678:2.29")
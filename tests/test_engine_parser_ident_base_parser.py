@@ -6,8 +6,14 @@ import pytest
 from chemical_composition import ChemicalComposition
 
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
-from unify_idents.engine_parsers.misc import get_composition_and_mass_and_accuracy
-from unify_idents.utils import merge_and_join_dicts
+import unify_idents.engine_parsers.misc as misc
+from unify_idents.engine_parsers.misc import (
+    get_composition_and_mass_and_accuracy,
+    get_peptide_automaton,
+    get_unimod_mapper,
+    read_meta_info_lookup,
+)
+from unify_idents.utils import hash_file_contents, merge_and_join_dicts
 
 
 def test_base_parser_read_rt_lookup_file():
@@ -132,6 +138,28 @@ def test_add_ranks_decreasing_engine_scores_better():
     assert obj.df["rank"].to_list() == [5, 2, 1, 3, 3]
 
 
+def test_filter_ranks_and_scores():
+    obj = IdentBaseParser(
+        input_file=None,
+        params={
+            "validation_score_field": {"msfragger_3_0": "msfragger:hyperscore"},
+            "bigger_scores_better": {"msfragger_3_0": True},
+            "max_rank": 2,
+            "score_cutoff": {"msfragger_3_0": 2},
+        },
+    )
+    obj.df = pd.DataFrame(
+        {
+            "spectrum_id": [1, 1, 1, 1, 2, 2],
+            "msfragger:hyperscore": [5, 2, 4, 4, 1, 3],
+            "search_engine": "msfragger_3_0",
+        }
+    )
+    obj.filter_ranks_and_scores()
+    assert obj.df["msfragger:hyperscore"].to_list() == [5, 4, 4, 3]
+    assert obj.df.index.to_list() == [0, 1, 2, 3]
+
+
 def test_add_protein_ids():
     obj = IdentBaseParser(
         input_file=None,
@@ -377,6 +405,63 @@ def test_merge_and_join_dicts():
     assert out_dict == {"a": "part_a;part_b", "b": "part_a;part_b"}
 
 
+def test_hash_file_contents(tmp_path):
+    file_a = tmp_path / "a.xml"
+    file_a.write_text("<a/>")
+    digest = hash_file_contents([file_a])
+    assert hash_file_contents([file_a]) == digest
+    assert hash_file_contents([file_a], salt="0.6.8") != digest
+    file_a.write_text("<b/>")
+    assert hash_file_contents([file_a]) != digest
+    assert hash_file_contents([tmp_path / "missing.xml"]) != digest
+
+
+def test_get_unimod_mapper_is_shared(tmp_path, monkeypatch):
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(misc, "_unimod_mappers", {})
+    xml_file_list = [pytest._test_path / "data" / "custom_mod.xml"]
+    mod_mapper = get_unimod_mapper(xml_file_list)
+    assert get_unimod_mapper(list(xml_file_list)) is mod_mapper
+    assert len(list(tmp_path.glob("unimod_mapper_*.pkl"))) == 1
+
+    # A new process attaches to the pickled index
+    monkeypatch.setattr(misc, "_unimod_mappers", {})
+    cached_mapper = get_unimod_mapper(xml_file_list)
+    assert cached_mapper is not mod_mapper
+    assert cached_mapper._df is not None
+    assert "CustomMod42" in cached_mapper.mass_to_names(
+        mod_mapper.name_to_mass("CustomMod42")[0], decimals=4
+    )
+
+
+def test_get_unimod_mapper_without_writable_cache(tmp_path, monkeypatch):
+    not_a_dir = tmp_path / "cache"
+    not_a_dir.write_text("")
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(not_a_dir / "unify_idents"))
+    monkeypatch.setattr(misc, "_unimod_mappers", {})
+    xml_file_list = [pytest._test_path / "data" / "custom_mod.xml"]
+    mod_mapper = get_unimod_mapper(xml_file_list)
+    assert get_unimod_mapper(xml_file_list) is mod_mapper
+    assert "CustomMod42" in mod_mapper.mass_to_names(
+        mod_mapper.name_to_mass("CustomMod42")[0], decimals=4
+    )
+    assert [p.name for p in tmp_path.iterdir()] == ["cache"]
+    assert not_a_dir.read_text() == ""
+
+
+def test_read_meta_info_lookup_is_shared():
+    rt_lookup_path = pytest._test_path / "data" / "BSA1_ursgal_lookup.csv"
+    rt_lookup = read_meta_info_lookup(rt_lookup_path, 2)
+    assert read_meta_info_lookup(str(rt_lookup_path), 2) is rt_lookup
+    assert read_meta_info_lookup(rt_lookup_path, 3) is not rt_lookup
+
+
+def test_get_peptide_automaton_is_shared():
+    auto = get_peptide_automaton(["GONEIN", "UPAND"])
+    assert get_peptide_automaton(("GONEIN", "UPAND")) is auto
+    assert [m[1] for m in auto.iter("XGONEINX")] == ["GONEIN"]
+
+
 def test_assert_only_iupac_and_missing_aas():
     obj = IdentBaseParser(
         input_file=None,
@@ -604,3 +689,58 @@ def test_clean_up_modifications():
     obj.clean_up_modifications()
     print(obj.df["modifications"])
     assert (obj.df["modifications"] == expected_mods).all()
+
+
+def test_get_fixed_mod_strings():
+    obj = IdentBaseParser(
+        input_file=None,
+        params={
+            "cpus": 2,
+            "rt_pickle_name": pytest._test_path / "data/_ursgal_lookup.csv",
+            "enzyme": "(?<=[KR])(?![P])",
+            "terminal_cleavage_site_integrity": "any",
+        },
+    )
+    sequences = pd.Series(["CAKCK", "AAA", "KC", "CAKCK"], index=[3, 5, 7, 9])
+    fixed_mod_strings = obj._get_fixed_mod_strings(
+        sequences,
+        [("C", "Carbamidomethyl"), ("K", "Label:13C(6)"), ("C", "Methyl")],
+    )
+    assert fixed_mod_strings.index.to_list() == [3, 5, 7, 9]
+    assert fixed_mod_strings.to_list() == [
+        "Carbamidomethyl:1;Carbamidomethyl:4;Label:13C(6):3;Label:13C(6):5;"
+        "Methyl:1;Methyl:4",
+        "",
+        "Carbamidomethyl:2;Label:13C(6):1;Methyl:2",
+        "Carbamidomethyl:1;Carbamidomethyl:4;Label:13C(6):3;Label:13C(6):5;"
+        "Methyl:1;Methyl:4",
+    ]
+
+
+def test_split_and_join_mod_strings():
+    obj = IdentBaseParser(
+        input_file=None,
+        params={
+            "cpus": 2,
+            "rt_pickle_name": pytest._test_path / "data/_ursgal_lookup.csv",
+            "enzyme": "(?<=[KR])(?![P])",
+            "terminal_cleavage_site_integrity": "any",
+        },
+    )
+    obj.df = pd.DataFrame(
+        {"modifications": ["2C(57.02), 5M(15.99)", np.nan, "", "1M(15.99)"]},
+        index=[3, 5, 7, 9],
+    )
+    mod_table = obj._split_mod_strings(
+        obj.df["modifications"], ", ", r"^(?P<pos>\d*)[^(]*\((?P<mass>[^)]+)"
+    )
+    assert mod_table.to_dict("list") == {
+        "pos": ["2", "5", "1"],
+        "mass": ["57.02", "15.99", "15.99"],
+        "psm": [0, 0, 3],
+    }
+    mod_strings = obj._join_mod_strings(
+        mod_table["psm"], mod_table["mass"] + ":" + mod_table["pos"]
+    )
+    assert mod_strings.index.to_list() == [3, 5, 7, 9]
+    assert mod_strings.to_list() == ["57.02:2;15.99:5", "", "", "15.99:1"]
@@ -0,0 +1,86 @@
+import gzip
+
+import pytest
+from lxml import etree
+
+from unify_idents.engine_parsers.mzid_reader import (
+    MzidReader,
+    extract_result_rows,
+    results_to_df,
+)
+from unify_idents.engine_parsers.psm_batch import rows_to_batch
+
+
+def test_mzid_reader_tables():
+    reader = MzidReader(
+        pytest._test_path / "data" / "BSA1_msgfplus_2021_03_22_unknown_mod.mzid"
+    )
+    assert reader.software_version == "Release (v2021.03.22)"
+    assert len(reader.peptides) == 24
+    assert reader.peptides["Pep_YICDNQDTISSK"]["sequence"] == "YICDNQDTISSK"
+    assert [
+        (m["location"], m["cv_params"][0]["name"])
+        for m in reader.peptides["Pep_YICDNQDTISSK"]["modifications"]
+    ] == [("3", "Carbamidomethyl")]
+    assert len(reader.search_modifications) == 3
+
+
+def test_mzid_reader_batches_match_single_results():
+    input_file = pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
+    keys = ["peptide_ref", "chargeState", "Comet:xcorr", "rank"]
+    root = etree.parse(str(input_file)).getroot()
+    expected = []
+    for result in root.iter("{*}SpectrumIdentificationResult"):
+        expected.extend(extract_result_rows(result))
+
+    batches = list(MzidReader(input_file).iter_result_batches(keys, batch_size=7))
+    assert len(batches) == 9
+    assert all(list(b.keys()) == ["spectrumID", *keys] for b in batches)
+    assert sum((b["Comet:xcorr"] for b in batches), []) == [
+        r["Comet:xcorr"] for r in expected
+    ]
+
+
+def test_extract_result_rows_max_rank():
+    result = etree.fromstring(
+        '<SpectrumIdentificationResult spectrumID="index=1">'
+        '<SpectrumIdentificationItem id="a" rank="1"/>'
+        '<SpectrumIdentificationItem id="b" rank="2"/>'
+        '<SpectrumIdentificationItem id="c" rank="2"/>'
+        '<SpectrumIdentificationItem id="d" rank="3"/>'
+        "</SpectrumIdentificationResult>"
+    )
+    assert len(extract_result_rows(result)) == 4
+    rows = extract_result_rows(result, max_rank=2)
+    assert [row["id"] for row in rows] == ["a", "b", "c"]
+
+
+def test_mzid_reader_reads_gzipped_input(tmp_path):
+    input_file = pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
+    compressed = tmp_path / "BSA1_comet_2020_01_4.mzid.gz"
+    compressed.write_bytes(gzip.compress(input_file.read_bytes()))
+    keys = ["peptide_ref", "chargeState"]
+    reader = MzidReader(compressed)
+    assert reader.peptides == MzidReader(input_file).peptides
+    assert list(reader.iter_result_batches(keys)) == list(
+        MzidReader(input_file).iter_result_batches(keys)
+    )
+
+
+def test_results_to_df():
+    rows = [
+        {"spectrumID": "index=1 scan=11", "chargeState": "2", "peptide_ref": "A"},
+        {"spectrumID": "index=2 scan=12", "peptide_ref": "B"},
+    ]
+    mapping_dict = {"chargeState": "charge", "peptide_ref": "sequence", "x": "y"}
+    reference_dict = {"charge": "1", "sequence": None, "spectrum_id": None}
+    df = results_to_df(
+        [rows_to_batch(rows)],
+        reference_dict,
+        mapping_dict,
+        spectrum_id_from_ref=True,
+    )
+    assert df["charge"].to_list() == ["2", "1"]
+    assert df["sequence"].to_list() == ["A", "B"]
+    assert df["spectrum_id"].to_list() == ["11", "12"]
+    assert "y" not in df.columns
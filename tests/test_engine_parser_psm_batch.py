@@ -0,0 +1,43 @@
+import pandas as pd
+
+from unify_idents.engine_parsers.psm_batch import (
+    batch_length,
+    batches_to_df,
+    concat_batches,
+    rows_to_batch,
+)
+
+
+def test_rows_to_batch():
+    rows = [{"sequence": "PEPTIDE", "charge": "2"}, {"sequence": "PEPTIDER", "x": 1}]
+    assert rows_to_batch(rows) == {
+        "sequence": ["PEPTIDE", "PEPTIDER"],
+        "charge": ["2", None],
+        "x": [None, 1],
+    }
+    assert rows_to_batch(rows, ["x"]) == {"x": [None, 1]}
+    assert batch_length(rows_to_batch(rows)) == 2
+    assert batch_length({}) == 0
+
+
+def test_concat_batches_fills_missing_columns():
+    batches = [
+        {"sequence": ["A", "B"]},
+        None,
+        {"charge": ["3"], "sequence": ["C"]},
+        {"sequence": ["D"]},
+    ]
+    assert concat_batches(batches) == {
+        "sequence": ["A", "B", "C", "D"],
+        "charge": [None, None, "3", None],
+    }
+
+
+def test_batches_to_df():
+    df = batches_to_df([{"sequence": ["A"], "charge": ["2"]}, {"sequence": ["B"]}])
+    assert df["sequence"].to_list() == ["A", "B"]
+    assert df["charge"].isna().to_list() == [False, True]
+    empty = batches_to_df([], columns=["sequence"])
+    assert isinstance(empty, pd.DataFrame)
+    assert list(empty.columns) == ["sequence"]
+    assert len(empty) == 0
@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from unify_idents.engine_parsers.base_parser import BaseParser
+from unify_idents.engine_parsers.registry import (
+    ParserEntry,
+    get_parser_candidates,
+    get_parser_registry,
+    register_parser,
+)
+from unify_idents.unify import sniff_file
+
+
+def test_registry_is_discovered_once():
+    assert get_parser_registry() is get_parser_registry()
+
+
+def test_registry_contains_builtin_parsers():
+    registry = get_parser_registry()
+    assert "xtandem_alanine" in registry
+    assert "msfragger_3" in registry
+    assert "flash_lfq_1_2_0" in registry
+
+
+def test_parser_candidates_filter_by_suffix():
+    candidates = get_parser_candidates(
+        pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
+    )
+    names = {c.name for c in candidates}
+    assert {"comet_2020_01_4", "msgfplus_2021_03_22"}.issubset(names)
+    assert "xtandem_alanine" not in names
+    assert "mascot_2_6_2" not in names
+
+
+def test_parser_candidates_filter_by_content():
+    p = pytest._test_path / "data" / "BSA1_msgfplus_2021_03_22.mzid"
+    candidates = get_parser_candidates(p, header=sniff_file(p))
+    assert [c.name for c in candidates] == ["msgfplus_2021_03_22"]
+
+
+def test_parser_entry_loads_lazily():
+    entry = ParserEntry(
+        "base", "unify_idents.engine_parsers.base_parser:BaseParser", (".xml",)
+    )
+    assert entry._parser is None
+    assert entry.load() is BaseParser
+    assert entry._parser is BaseParser
+
+
+def test_register_parser_class():
+    class CustomParser(BaseParser):
+        pass
+
+    entry = register_parser("custom_test_parser", CustomParser, suffixes=(".txt",))
+    try:
+        assert get_parser_registry()["custom_test_parser"] is entry
+        assert entry.load() is CustomParser
+        assert entry in get_parser_candidates(Path("some_file.txt"))
+        assert entry not in get_parser_candidates(Path("some_file.xml"))
+    finally:
+        get_parser_registry().pop("custom_test_parser")
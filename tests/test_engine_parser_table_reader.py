@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from unify_idents.engine_parsers.table_reader import read_table
+
+
+def test_read_table_projects_and_types_columns():
+    input_file = pytest._test_path / "data" / "BSA1_msfragger_3.tsv"
+    df = read_table(
+        input_file,
+        delimiter="\t",
+        columns=["peptide", "charge", "hyperscore", "peptide_prev_aa", "missing"],
+        dtypes={
+            "charge": "int32",
+            "hyperscore": "float32",
+            "peptide_prev_aa": "category",
+            "missing": "int32",
+        },
+    )
+    assert list(df.columns) == ["charge", "peptide", "peptide_prev_aa", "hyperscore"]
+    assert len(df) == 3417
+    assert df["charge"].dtype == "int32"
+    assert df["hyperscore"].dtype == "float32"
+    assert isinstance(df["peptide_prev_aa"].dtype, pd.CategoricalDtype)
+
+
+def test_read_table_chunks_match_single_read(tmp_path):
+    input_file = tmp_path / "table.tsv"
+    input_file.write_text("aa\tscore\nK\t1.5\nR\t2.5\n-\t3.5\nK\t4.5\n")
+    expected = read_table(input_file, delimiter="\t", dtypes={"aa": "category"})
+    df = read_table(input_file, delimiter="\t", dtypes={"aa": "category"}, chunk_size=1)
+    assert df["aa"].to_list() == ["K", "R", "-", "K"] == expected["aa"].to_list()
+    assert isinstance(df["aa"].dtype, pd.CategoricalDtype)
+    assert df["score"].to_list() == [1.5, 2.5, 3.5, 4.5]
+
+
+def test_read_table_row_filter(tmp_path):
+    input_file = tmp_path / "table.tsv"
+    input_file.write_text("rank\tscore\n1\t1.5\n2\t2.5\n1\t3.5\n3\t4.5\n")
+    df = read_table(
+        input_file,
+        delimiter="\t",
+        chunk_size=2,
+        row_filter=lambda chunk: chunk["rank"] <= 1,
+    )
+    assert df["score"].to_list() == [1.5, 3.5]
+    assert df.index.to_list() == [0, 1]
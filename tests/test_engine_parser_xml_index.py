@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from lxml import etree
+
+import unify_idents.engine_parsers.xml_index as xml_index
+
+from unify_idents.engine_parsers.xml_index import (
+    XML_INDEX_SUFFIX,
+    build_xml_index,
+    get_xml_index,
+    parse_slices,
+    read_slices,
+)
+
+
+def test_build_xml_index_nested_and_prefixed(tmp_path):
+    xml_file = tmp_path / "nested.xml"
+    xml_file.write_text(
+        '<?xml version="1.0"?>\n'
+        '<root xmlns="http://a" xmlns:b="http://b">'
+        '<group z="1"><group type="support"><b:trace/></group></group>'
+        '<group type="parameters"><note>x</note></group>'
+        '<b:group z="2"/>'
+        '<groups z="3"></groups>'
+        "</root>"
+    )
+    index = build_xml_index(xml_file, "group", attribute="z")
+    assert index["namespaces"] == 'xmlns="http://a" xmlns:b="http://b"'
+    assert [s.decode() for s in read_slices(xml_file, index["offsets"])] == [
+        '<group z="1"><group type="support"><b:trace/></group></group>',
+        '<b:group z="2"/>',
+    ]
+    elements = parse_slices(xml_file, index["offsets"], index["namespaces"])
+    assert [e.tag for e in elements] == ["{http://a}group", "{http://b}group"]
+    assert len(build_xml_index(xml_file, "group")["offsets"]) == 3
+
+
+def test_parse_slices_matches_tree():
+    input_file = pytest._test_path / "data" / "BSA1_msgfplus_2021_03_22.mzid"
+    index = build_xml_index(input_file, "SpectrumIdentificationResult")
+    elements = parse_slices(
+        input_file, index["offsets"], index["namespaces"], index["encoding"]
+    )
+    expected = etree.parse(str(input_file)).findall(
+        ".//{*}SpectrumIdentificationResult"
+    )
+    assert len(elements) == 91
+    assert [etree.tostring(e, method="c14n") for e in elements] == [
+        etree.tostring(e, method="c14n") for e in expected
+    ]
+
+
+def test_get_xml_index_is_cached_next_to_input(tmp_path):
+    input_file = tmp_path / "BSA1_comet_2020_01_4.mzid"
+    shutil.copy(pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid", input_file)
+    index = get_xml_index(input_file, "SpectrumIdentificationResult")
+    assert len(index["offsets"]) == 60
+    index_file = (
+        tmp_path / f".{input_file.name}.SpectrumIdentificationResult{XML_INDEX_SUFFIX}"
+    )
+    with open(index_file) as f:
+        assert json.load(f) == index
+
+    # Cached indices are used as long as the input is unchanged
+    cached = dict(index, offsets=[[0, 1]])
+    with open(index_file, "w") as f:
+        json.dump(cached, f)
+    assert get_xml_index(input_file, "SpectrumIdentificationResult") == cached
+    stat = input_file.stat()
+    os.utime(input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert get_xml_index(input_file, "SpectrumIdentificationResult")["offsets"] == (
+        index["offsets"]
+    )
+
+
+def test_get_xml_index_without_cache_dir(tmp_path, monkeypatch):
+    not_a_dir = tmp_path / "cache"
+    not_a_dir.write_text("")
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(not_a_dir / "unify_idents"))
+    input_file = tmp_path / "BSA1_comet_2020_01_4.mzid"
+    shutil.copy(pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid", input_file)
+    index = get_xml_index(input_file, "SpectrumIdentificationResult")
+    assert len(index["offsets"]) == 60
+    assert get_xml_index(input_file, "SpectrumIdentificationResult") == index
+
+    # Without any writable location the index is still built
+    input_file.parent.chmod(0o500)
+    try:
+        other_tag = get_xml_index(input_file, "SpectrumIdentificationItem")
+    finally:
+        input_file.parent.chmod(0o700)
+    assert len(other_tag["offsets"]) == 60
+
+
+def test_read_slices_with_evicted_maps_in_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(xml_index, "MAX_MAPPED_FILES", 1)
+    files = []
+    for i in range(4):
+        files.append(tmp_path / f"{i}.txt")
+        files[-1].write_bytes(str(i).encode() * 100000)
+    offsets = [[0, 100000], [50000, 100000]] * 50
+
+    def read(i):
+        data = files[i % len(files)].read_bytes()
+        return read_slices(files[i % len(files)], offsets) == [data, data[50000:]] * 50
+
+    # Frequent thread switches make evictions during slicing likely
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            assert all(pool.map(read, range(400)))
+    finally:
+        sys.setswitchinterval(switch_interval)
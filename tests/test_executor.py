@@ -0,0 +1,330 @@
+import os
+import threading
+import time
+
+import pytest
+
+import unify_idents.executor as executor_module
+from unify_idents.executor import (
+    INLINE_MAX_COST,
+    MAX_BATCH_SIZE,
+    MIN_BATCH_SIZE,
+    THREAD_MAX_COST,
+    UnifyExecutor,
+    _MissingState,
+    _cgroup_cpu_limit,
+    _run_pool_chunk,
+    auto_batch_size,
+    available_cpus,
+    get_concurrency_limit,
+    get_executor,
+    set_concurrency_limit,
+)
+
+
+def _set_offset(offset):
+    _add_offset.offset = offset
+    _add_offset.init_calls = getattr(_add_offset, "init_calls", 0) + 1
+
+
+def _add_offset(x):
+    return x + _add_offset.offset
+
+
+def _add_offset_batch(batch):
+    return (len(batch), [x + _add_offset.offset for x in batch])
+
+
+def _init_calls(x):
+    return os.getpid(), getattr(_add_offset, "init_calls", 0)
+
+
+_active = {"now": 0, "max": 0}
+_active_lock = threading.Lock()
+
+
+def _track_concurrency(x):
+    with _active_lock:
+        _active["now"] += 1
+        _active["max"] = max(_active["max"], _active["now"])
+    time.sleep(0.01)
+    with _active_lock:
+        _active["now"] -= 1
+    return x
+
+
+def _track_offset(x):
+    _track_concurrency(x)
+    return x + _add_offset.offset
+
+
+class _CountedPickles:
+    pickles = 0
+
+    def __init__(self, offset):
+        self.offset = offset
+
+    def __reduce__(self):
+        _CountedPickles.pickles += 1
+        return (_CountedPickles, (self.offset,))
+
+
+def _set_counted_offset(counted):
+    _set_offset(counted.offset)
+
+
+def test_executor_map_with_initializer():
+    with UnifyExecutor(max_workers=2, mode="process") as executor:
+        assert executor.map(
+            _add_offset, range(10), initializer=_set_offset, initargs=(5,)
+        ) == list(range(5, 15))
+        assert executor.starmap(pow, [(2, 3), (3, 2)]) == [8, 9]
+        assert executor.map(_add_offset, []) == []
+
+
+def test_executor_reuses_workers_and_state():
+    with UnifyExecutor(max_workers=2, mode="process") as executor:
+        pool = executor.start()
+        for _ in range(3):
+            executor.map(_add_offset, range(20), initializer=_set_offset, initargs=(1,))
+        assert executor.start() is pool
+        calls = dict(executor.map(_init_calls, range(20), chunksize=1))
+        # Every worker ran the initializer once, although three stages used it
+        assert set(calls.values()).issubset({0, 1})
+    assert executor._pool is None
+
+
+def test_executor_sends_state_until_workers_hold_it(monkeypatch):
+    monkeypatch.setattr(executor_module, "_slots", None)
+    monkeypatch.setattr(executor_module, "_concurrency_limit", None)
+    set_concurrency_limit(2)
+    with UnifyExecutor(max_workers=2, mode="process") as executor:
+        for _ in range(2):
+            _CountedPickles.pickles = 0
+            assert executor.map(
+                _track_offset,
+                range(60),
+                initializer=_set_counted_offset,
+                initargs=(_CountedPickles(2),),
+                chunksize=1,
+            ) == list(range(2, 62))
+            # Once per state key and with the first chunks of each worker
+            assert _CountedPickles.pickles < 20
+        # Without further state, later stages send none
+        assert _CountedPickles.pickles == 1
+        # Workers which switched to another state get it back on demand
+        executor.map(_add_offset, range(4), initializer=_set_offset, initargs=(3,))
+        assert executor.map(
+            _track_offset,
+            range(10),
+            initializer=_set_counted_offset,
+            initargs=(_CountedPickles(2),),
+        ) == list(range(2, 12))
+
+
+def test_run_pool_chunk_reports_missing_state(monkeypatch):
+    monkeypatch.setattr(executor_module, "_worker_state_key", "other")
+    pid, result = _run_pool_chunk(("key", None), _add_offset, [1], "item")
+    assert pid == os.getpid()
+    assert isinstance(result, _MissingState)
+    state = ("key", (_set_offset, (1,)))
+    assert _run_pool_chunk(state, _add_offset, [1], "item")[1] == [2]
+    assert _run_pool_chunk(("key", None), _add_offset, [2], "item")[1] == [3]
+
+
+def test_get_executor_from_params():
+    executor = UnifyExecutor(max_workers=1)
+    assert get_executor({"executor": executor}) is executor
+    assert get_executor({"cpus": 1}) is get_executor({"cpus": 1})
+
+
+def test_executor_select_mode():
+    executor = UnifyExecutor(max_workers=4)
+    assert executor.select_mode(INLINE_MAX_COST - 1) == "inline"
+    assert executor.select_mode(INLINE_MAX_COST) == "thread"
+    assert executor.select_mode(THREAD_MAX_COST) == "process"
+    assert executor.select_mode(THREAD_MAX_COST, mode="inline") == "inline"
+    assert UnifyExecutor(max_workers=1).select_mode(THREAD_MAX_COST) == "inline"
+    with pytest.raises(ValueError):
+        executor.select_mode(1, mode="fork")
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread"])
+def test_executor_map_in_process(mode):
+    executor = UnifyExecutor(max_workers=2)
+    assert executor.map(
+        _add_offset, range(10), initializer=_set_offset, initargs=(3,), mode=mode
+    ) == list(range(3, 13))
+    assert {pid for pid, _ in executor.map(_init_calls, range(4), mode=mode)} == {
+        os.getpid()
+    }
+    # No worker processes are started for inline and thread execution
+    assert executor._pool is None
+    executor.shutdown()
+
+
+def test_cgroup_cpu_limit_v2(tmp_path):
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert _cgroup_cpu_limit(tmp_path) == 2
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert _cgroup_cpu_limit(tmp_path) is None
+
+
+def test_cgroup_cpu_limit_v1(tmp_path):
+    cpu_dir = tmp_path / "cpu,cpuacct"
+    cpu_dir.mkdir()
+    (cpu_dir / "cpu.cfs_quota_us").write_text("200000\n")
+    (cpu_dir / "cpu.cfs_period_us").write_text("100000\n")
+    assert _cgroup_cpu_limit(tmp_path) == 2
+    (cpu_dir / "cpu.cfs_quota_us").write_text("-1\n")
+    assert _cgroup_cpu_limit(tmp_path) is None
+
+
+def test_available_cpus_respects_affinity():
+    assert 1 <= available_cpus() <= len(os.sched_getaffinity(0))
+
+
+def test_concurrency_limit_is_shared(monkeypatch):
+    monkeypatch.setattr(executor_module, "_slots", None)
+    monkeypatch.setattr(executor_module, "_concurrency_limit", None)
+    monkeypatch.setenv("UNIFY_IDENTS_MAX_CONCURRENCY", "3")
+    assert get_concurrency_limit() == 3
+    set_concurrency_limit(1)
+    executors = [UnifyExecutor(max_workers=4), UnifyExecutor(max_workers=4)]
+    runs = [
+        threading.Thread(
+            target=e.map,
+            args=(_track_concurrency, range(8)),
+            kwargs={"chunksize": 1, "mode": "thread"},
+        )
+        for e in executors
+    ]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join()
+    for e in executors:
+        e.shutdown()
+    assert _active["max"] == 1
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_executor_imap_batches_is_lazy(mode):
+    produced = []
+
+    def batches():
+        for i in range(0, 40, 4):
+            produced.append(i)
+            yield list(range(i, i + 4))
+
+    executor = UnifyExecutor(max_workers=2)
+    results = executor.imap_batches(
+        _add_offset, batches(), initializer=_set_offset, initargs=(1,), mode=mode
+    )
+    assert next(results) == [1, 2, 3, 4]
+    assert len(produced) < 10
+    assert [x for batch in results for x in batch] == list(range(5, 41))
+    executor.shutdown()
+
+
+def test_auto_batch_size():
+    assert auto_batch_size(10, 4) == MIN_BATCH_SIZE
+    assert auto_batch_size(8000, 4) == 500
+    assert auto_batch_size(10**8, 4) == MAX_BATCH_SIZE
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_executor_map_batches(mode):
+    executor = UnifyExecutor(max_workers=2)
+    results = executor.map_batches(
+        _add_offset_batch,
+        range(10),
+        initializer=_set_offset,
+        initargs=(2,),
+        batch_size=4,
+        mode=mode,
+    )
+    assert results == [(4, [2, 3, 4, 5]), (4, [6, 7, 8, 9]), (2, [10, 11])]
+    batches = executor.imap_batches(
+        _add_offset_batch,
+        [[0, 1], [2]],
+        initializer=_set_offset,
+        initargs=(1,),
+        mode=mode,
+        batched=True,
+    )
+    assert list(batches) == [(2, [1, 2]), (1, [3])]
+    executor.shutdown()
+
+
+class _Progress:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, n):
+        self.updates.append(n)
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_executor_advances_progress_per_chunk(mode):
+    executor = UnifyExecutor(max_workers=2)
+    progress = _Progress()
+    results = executor.map_batches(
+        _add_offset_batch,
+        range(10),
+        initializer=_set_offset,
+        initargs=(0,),
+        batch_size=4,
+        mode=mode,
+        progress=progress,
+    )
+    assert [n for n, _ in results] == progress.updates == [4, 4, 2]
+    progress = _Progress()
+    batches = executor.imap_batches(
+        _add_offset,
+        iter([[0, 1, 2], [3]]),
+        initializer=_set_offset,
+        initargs=(1,),
+        mode=mode,
+        progress=progress,
+    )
+    assert next(batches) == [1, 2, 3]
+    assert progress.updates == [3]
+    assert list(batches) == [[4]]
+    assert progress.updates == [3, 1]
+    executor.shutdown()
+
+
+def test_local_runs_share_equal_state(monkeypatch):
+    monkeypatch.setattr(executor_module, "_slots", None)
+    monkeypatch.setattr(executor_module, "_concurrency_limit", None)
+    monkeypatch.setitem(_active, "max", 0)
+    set_concurrency_limit(4)
+    executor = UnifyExecutor(max_workers=2)
+    results = {}
+
+    def run(name, offset):
+        results[name] = executor.map(
+            _track_offset,
+            range(8),
+            initializer=_set_offset,
+            initargs=(offset,),
+            chunksize=1,
+            mode="inline",
+        )
+
+    runs = [
+        threading.Thread(target=run, args=(name, offset))
+        for name, offset in [("a", 5), ("b", 5), ("c", 7)]
+    ]
+    for r in runs:
+        r.start()
+    for r in runs:
+        r.join()
+    # Runs with equal state overlap, runs with other state never see it
+    assert _active["max"] >= 2
+    assert results == {
+        "a": list(range(5, 13)),
+        "b": list(range(5, 13)),
+        "c": list(range(7, 15)),
+    }
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Import time of all modules imported while building Unify, in seconds. The
+# lazy imports take well below a second, eager ones add parsers of all
+# engines and their dependencies.
+UNIFY_INIT_IMPORT_BUDGET = 2.0
+
+HEAVY_MODULES = [
+    "IsoSpecPy",
+    "ahocorasick",
+    "chemical_composition",
+    "lxml",
+    "pandas",
+    "peptide_mapper",
+    "tqdm",
+    "unimod_mapper",
+    "uparma",
+]
+
+# Needed to build a parser, see Unify.__init__
+UNIFY_INIT_MODULES = ["chemical_composition", "pandas", "unimod_mapper"]
+
+
+# Returns the loaded heavy modules and the cumulative import time in seconds of
+# every top level import. Import times only count time spent importing, not the
+# work done by code.
+def _run_in_fresh_interpreter(code, env=None):
+    code += f"""
+import json, sys
+print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if not module.startswith("  "):
+            import_times[module.strip()] = int(cumulative) / 1e6
+    return json.loads(result.stdout.strip().splitlines()[-1]), import_times
+
+
+def test_import_unify_idents_budget():
+    loaded, import_times = _run_in_fresh_interpreter("import unify_idents")
+    for module in HEAVY_MODULES:
+        assert module not in loaded
+    # Relative to pandas, so the budget scales with machine speed and load
+    _, pandas_import_times = _run_in_fresh_interpreter("import pandas")
+    assert import_times["unify_idents"] < pandas_import_times["pandas"]
+
+
+@pytest.mark.slow
+def test_construct_unify_budget(tmp_path):
+    input_file = pytest._test_path / "data" / "BSA1_msfragger_3.tsv"
+    code = f"""
+from unify_idents import Unify
+u = Unify({str(input_file)!r}, {{"modifications": []}})
+"""
+    env = dict(os.environ, UNIFY_IDENTS_CACHE_DIR=str(tmp_path))
+    # First run fills the persistent caches
+    _run_in_fresh_interpreter(code, env=env)
+    loaded, import_times = _run_in_fresh_interpreter(code, env=env)
+    for module in set(HEAVY_MODULES) - set(UNIFY_INIT_MODULES):
+        assert module not in loaded
+    assert sum(import_times.values()) < UNIFY_INIT_IMPORT_BUDGET
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import gzip
 from pathlib import Path
 
 import pytest
@@ -15,7 +16,7 @@ from unify_idents.engine_parsers.ident.msgfplus_2021_03_22_parser import (
 )
 from unify_idents.engine_parsers.ident.omssa_2_1_9_parser import Omssa_Parser
 from unify_idents.engine_parsers.ident.xtandem_alanine import XTandemAlanine_Parser
-from unify_idents.unify import Unify
+from unify_idents.unify import Unify, detect_format, sniff_file, unify_batch
 
 
 def test_unify_get_parser_classes():
@@ -318,3 +319,63 @@ def test_unify_get_mascot_parser():
         },
     )
     assert isinstance(u.parser, Mascot_2_6_2_Parser)
+
+
+def test_sniff_file_is_cached_by_fingerprint():
+    p = pytest._test_path / "data" / "BSA1_msfragger_3.tsv"
+    header = sniff_file(p)
+    assert sniff_file(p) is header
+    assert header.format == "tsv"
+    assert header.lines(1).startswith("scannum\t")
+
+
+def test_sniff_file_detects_format_from_content(tmp_path):
+    src = pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
+    renamed = tmp_path / "BSA1_comet"
+    renamed.write_bytes(src.read_bytes())
+    header = sniff_file(renamed)
+    assert header.format == "mzid"
+    assert Comet_2020_01_4_Parser.check_parser_compatibility(renamed, header=header)
+    assert not MSGFPlus_2021_03_22_Parser.check_parser_compatibility(
+        renamed, header=header
+    )
+
+
+def test_sniff_file_reads_compressed_inputs(tmp_path):
+    src = pytest._test_path / "data" / "BSA1_comet_2020_01_4.mzid"
+    compressed = tmp_path / "BSA1_comet_2020_01_4.mzid.gz"
+    compressed.write_bytes(gzip.compress(src.read_bytes()))
+    header = sniff_file(compressed)
+    assert header.format == "mzid"
+    assert header.data == sniff_file(src).data
+    assert Comet_2020_01_4_Parser.check_parser_compatibility(compressed, header=header)
+
+
+def test_detect_format():
+    assert detect_format('<?xml version="1.0"?>\n<MzIdentML id="Comet">') == "mzid"
+    assert detect_format('<?xml version="1.0"?>\n<bioml>') == "xml"
+    assert detect_format("MIME-Version: 1.0 (Generated by Mascot)") == "mascot_dat"
+    assert detect_format("#version: 2.0.0\nScan Number\tTitle\n") == "tsv"
+    assert detect_format("Spectrum number, Filename/id\n") == "csv"
+    assert detect_format(">sp|P02769|ALBU_BOVIN\n") is None
+
+
+def test_unify_batch():
+    input_files = [
+        pytest._test_path / "data" / "BSA1_msfragger_3.tsv",
+        pytest._test_path / "data" / "BSA1_msamanda_2_0_0_17442.csv",
+    ]
+    params = {
+        "rt_pickle_name": pytest._test_path / "data" / "BSA1_ursgal_lookup.csv",
+        "database": pytest._test_path / "data" / "BSA.fasta",
+        "modifications": [
+            {"aa": "M", "type": "opt", "position": "any", "name": "Oxidation"},
+            {"aa": "C", "type": "fix", "position": "any", "name": "Carbamidomethyl"},
+        ],
+    }
+    dfs = unify_batch(input_files, params, max_workers=2)
+    assert list(dfs.keys()) == input_files
+    assert "mapped_mods" not in params
+    df = unify_batch(input_files, params, combine=True)
+    assert len(df) == sum(len(d) for d in dfs.values())
+    assert set(df["search_engine"]) == {"msfragger_3_0", "msamanda_2_0_0_17442"}
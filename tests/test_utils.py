@@ -0,0 +1,70 @@
+import bz2
+import gzip
+
+import pytest
+
+from unify_idents.utils import (
+    get_cache_dir,
+    get_compression,
+    input_suffix,
+    join_consecutive,
+    open_input,
+    write_cache_file,
+)
+
+
+def test_get_compression():
+    assert get_compression("BSA1.mzid") is None
+    assert get_compression("BSA1.mzid.gz") == "gzip"
+    assert get_compression("BSA1.dat.BZ2") == "bz2"
+    assert get_compression("BSA1.tsv.zst") == "zstd"
+    assert input_suffix("BSA1.mzid.gz") == ".mzid"
+    assert input_suffix("BSA1.tsv") == ".tsv"
+
+
+@pytest.mark.parametrize(
+    "suffix,compress",
+    [("", bytes), (".gz", gzip.compress), (".bz2", bz2.compress)],
+)
+def test_open_input(tmp_path, suffix, compress):
+    input_file = tmp_path / f"input.txt{suffix}"
+    input_file.write_bytes(compress("Mascot\nÄ\n".encode()))
+    with open_input(input_file) as f:
+        assert f.read() == "Mascot\nÄ\n".encode()
+    with open_input(input_file, "rt", encoding="utf-8") as f:
+        assert f.readlines() == ["Mascot\n", "Ä\n"]
+
+
+def test_open_input_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    input_file = tmp_path / "input.txt.zst"
+    input_file.write_bytes(zstandard.ZstdCompressor().compress(b"Mascot\n"))
+    with open_input(input_file, "rt") as f:
+        assert f.read() == "Mascot\n"
+
+
+def test_join_consecutive():
+    keys, joined = join_consecutive([0, 0, 2, 3, 3, 3], list("abcdef"), ";")
+    assert keys.tolist() == [0, 2, 3]
+    assert joined == ["a;b", "c", "d;e;f"]
+    keys, joined = join_consecutive([], [], ";")
+    assert len(keys) == 0 and joined == []
+
+
+def test_write_cache_file(tmp_path, monkeypatch):
+    cache_file = tmp_path / "cache.txt"
+    assert write_cache_file(cache_file, lambda f: f.write("a"), mode="w") is True
+    assert cache_file.read_text() == "a"
+
+    def fail(f):
+        f.write("b")
+        raise OSError("No space left on device")
+
+    assert write_cache_file(cache_file, fail, mode="w") is False
+    assert cache_file.read_text() == "a"
+    assert [f.name for f in tmp_path.iterdir()] == ["cache.txt"]
+    assert write_cache_file(tmp_path / "missing" / "cache.txt", print) is False
+
+    monkeypatch.setenv("UNIFY_IDENTS_CACHE_DIR", str(cache_file / "unify_idents"))
+    with pytest.raises(OSError):
+        get_cache_dir()
@@ -2,4 +2,5 @@
 import unify_idents.engine_parsers
 import unify_idents.engine_parsers.ident
 import unify_idents.engine_parsers.quant
-from unify_idents.unify import Unify
+from unify_idents.executor import UnifyExecutor
+from unify_idents.unify import Unify, unify_batch
@@ -0,0 +1,406 @@
+"""Resident unify service keeping shared resources warm across jobs."""
+import argparse
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from unify_idents.engine_parsers.registry import get_parser_registry
+from unify_idents.executor import UnifyExecutor
+from unify_idents.utils import input_suffix
+
+DEFAULT_PORT = 8765
+SPOOL_OUTPUT_SUFFIX = "_unified.csv"
+# Params a job may override, all others are fixed when the service starts
+JOB_PARAMS = {
+    "bigger_scores_better",
+    "csv_chunk_size",
+    "csv_engine",
+    "decoy_tag",
+    "enzyme",
+    "execution_mode",
+    "label",
+    "max_rank",
+    "modifications",
+    "score_cutoff",
+    "spectrum_batch_size",
+    "terminal_cleavage_site_integrity",
+    "validation_score_field",
+    "xml_index",
+    "xml_streaming",
+}
+
+
+def write_dataframe(df, output_file):
+    """Write a unified dataframe atomically, as tsv for .tsv files else as csv.
+
+    Args:
+        df (pd.DataFrame): unified dataframe
+        output_file (Path): path to output file
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    sep = "\t" if output_file.suffix == ".tsv" else ","
+    with tempfile.NamedTemporaryFile(
+        "w", dir=output_file.parent, prefix=f".{output_file.name}", delete=False
+    ) as f:
+        df.to_csv(f, sep=sep, index=False)
+    os.replace(f.name, output_file)
+
+
+class UnifyService:
+    """Run unify jobs in one process, sharing mappers, lookups and workers.
+
+    A job is a dict with "input_file" and "output_file" and optionally
+    "params", which are merged over the service params, and
+    "immutable_peptides". Jobs may only override JOB_PARAMS and only write
+    inside output_root.
+    """
+
+    def __init__(
+        self, params=None, immutable_peptides=None, executor=None, output_root=None
+    ):
+        """Initialize service.
+
+        Args:
+            params (dict, optional): default ursgal param dict of all jobs
+            immutable_peptides (str, optional): default path to file with immutable peptides
+            executor (UnifyExecutor, optional): executor shared by all jobs
+            output_root (str, optional): directory all outputs have to be in,
+                defaults to the current working directory
+        """
+        if params is None:
+            params = {}
+        self.params = dict(params)
+        self.immutable_peptides = immutable_peptides
+        if executor is None:
+            executor = UnifyExecutor(max_workers=self.params.get("cpus", None))
+        self.executor = executor
+        self.params["executor"] = executor
+        self.output_root = Path(output_root or os.getcwd()).resolve()
+
+    def warm(self):
+        """Load uparma, shared resources of the default params and start workers."""
+        from unify_idents.engine_parsers.base_parser import get_param_mapper
+        from unify_idents.unify import warm_shared_resources
+
+        get_param_mapper()
+        warm_shared_resources(self.params, immutable_peptides=self.immutable_peptides)
+        self.executor.start()
+
+    def close(self):
+        """Shut down workers."""
+        self.executor.shutdown()
+
+    def run_job(self, job):
+        """Unify one input file and write the result to the requested path.
+
+        Args:
+            job (dict): job description
+
+        Returns:
+            dict: job result with output file and number of rows
+        """
+        from unify_idents.unify import Unify
+
+        params = {**self.params, **job.get("params", {})}
+        params["executor"] = self.executor
+        df = Unify(
+            job["input_file"],
+            params,
+            immutable_peptides=job.get("immutable_peptides", self.immutable_peptides),
+        ).get_dataframe()
+        write_dataframe(df, job["output_file"])
+        return {"status": "ok", "output_file": str(job["output_file"]), "rows": len(df)}
+
+    def check_job(self, job):
+        """Reject params a job may not override and outputs outside output_root.
+
+        Args:
+            job (dict): job description
+
+        Returns:
+            dict: job with resolved output file
+
+        Raises:
+            ValueError: if the job overrides other params or writes elsewhere
+        """
+        params = job.get("params", {})
+        if not isinstance(params, dict):
+            raise ValueError("Job params have to be a json object.")
+        forbidden = set(params) - JOB_PARAMS
+        if len(forbidden) > 0:
+            raise ValueError(f"Job may not override params {sorted(forbidden)}.")
+        output_file = Path(job["output_file"]).resolve()
+        if self.output_root not in output_file.parents:
+            raise ValueError(f"Output file has to be inside {self.output_root}.")
+        return {**job, "output_file": str(output_file)}
+
+    def handle(self, job):
+        """Run a job and report failures instead of raising.
+
+        Args:
+            job (dict): job description
+
+        Returns:
+            dict: job result, status is "error" if the job failed
+        """
+        from loguru import logger
+
+        try:
+            if not isinstance(job, dict):
+                raise ValueError("Jobs have to be json objects.")
+            missing = {"input_file", "output_file"} - set(job)
+            if len(missing) > 0:
+                raise ValueError(f"Job is missing {sorted(missing)}.")
+            return self.run_job(self.check_job(job))
+        except Exception as e:
+            logger.error(f"Job {job} failed: {e!r}")
+            return {"status": "error", "error": repr(e)}
+
+
+class _UnixJobHandler(socketserver.StreamRequestHandler):
+    """Read one json job per line and answer with one json result per line."""
+
+    def handle(self):
+        """Answer all jobs of a connection."""
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                response = {"status": "error", "error": repr(e)}
+            else:
+                response = self.server.service.handle(job)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _HTTPJobHandler(BaseHTTPRequestHandler):
+    """Accept json jobs via POST /jobs, GET /health reports readiness.
+
+    Only application/json requests are accepted, so browsers cannot submit
+    jobs from other origins without a preflight.
+    """
+
+    def _respond(self, code, response):
+        body = json.dumps(response).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Report service health."""
+        if self.path != "/health":
+            self._respond(404, {"status": "error", "error": "Not found"})
+        else:
+            self._respond(200, {"status": "ok"})
+
+    def do_POST(self):
+        """Run a job."""
+        if self.path != "/jobs":
+            self._respond(404, {"status": "error", "error": "Not found"})
+            return
+        if self.headers.get_content_type() != "application/json":
+            self._respond(
+                415, {"status": "error", "error": "Jobs have to be application/json"}
+            )
+            return
+        try:
+            job = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        except (TypeError, ValueError) as e:
+            self._respond(400, {"status": "error", "error": repr(e)})
+            return
+        response = self.server.service.handle(job)
+        self._respond(200 if response["status"] == "ok" else 500, response)
+
+    def log_message(self, format, *args):
+        """Log requests via loguru."""
+        from loguru import logger
+
+        logger.debug(format % args)
+
+
+def make_unix_server(service, socket_path):
+    """Create a server accepting line delimited json jobs on a Unix socket.
+
+    Args:
+        service (UnifyService): service running the jobs
+        socket_path (str): path to the socket, a stale socket is replaced
+
+    Returns:
+        server (socketserver.UnixStreamServer): server, call serve_forever to run it
+    """
+    socket_path = Path(socket_path)
+    if socket_path.is_socket():
+        socket_path.unlink()
+    server = _UnixJobServer(str(socket_path), _UnixJobHandler)
+    server.service = service
+    return server
+
+
+def make_http_server(service, port=DEFAULT_PORT, host="127.0.0.1"):
+    """Create a server accepting json jobs via POST /jobs on localhost.
+
+    Args:
+        service (UnifyService): service running the jobs
+        port (int, optional): port, 0 picks a free port
+        host (str, optional): interface to bind to
+
+    Returns:
+        server (ThreadingHTTPServer): server, call serve_forever to run it
+    """
+    server = ThreadingHTTPServer((host, port), _HTTPJobHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+class SpoolWatcher:
+    """Unify engine outputs which appear in a spool directory.
+
+    Files are picked up once their size and modification time did not change
+    between two polls, so partially written files are skipped. Results are
+    written to output_dir as <input name>_unified.csv.
+    """
+
+    def __init__(self, service, spool_dir, output_dir=None, poll_interval=1.0):
+        """Initialize watcher.
+
+        Args:
+            service (UnifyService): service running the jobs
+            spool_dir (str): directory to watch
+            output_dir (str, optional): directory for results, defaults to spool_dir
+            poll_interval (float, optional): seconds between polls
+        """
+        self.service = service
+        self.spool_dir = Path(spool_dir)
+        self.output_dir = Path(output_dir) if output_dir is not None else None
+        self.poll_interval = poll_interval
+        self._pending = {}
+        self._done = {}
+
+    def _candidates(self):
+        suffixes = set()
+        for entry in get_parser_registry().values():
+            suffixes.update(entry.suffixes or ())
+        for file in sorted(self.spool_dir.iterdir()):
+            if (
+                file.is_file()
+                and not file.name.startswith(".")
+                and not file.name.endswith(SPOOL_OUTPUT_SUFFIX)
+                and input_suffix(file) in suffixes
+            ):
+                yield file
+
+    def poll(self):
+        """Scan the spool directory once and run jobs for all settled files.
+
+        Returns:
+            list: job results
+        """
+        results = []
+        for file in self._candidates():
+            stat = file.stat()
+            fingerprint = (stat.st_size, stat.st_mtime_ns)
+            if self._done.get(file) == fingerprint:
+                continue
+            if self._pending.get(file) != fingerprint:
+                self._pending[file] = fingerprint
+                continue
+            del self._pending[file]
+            output_dir = self.output_dir or self.spool_dir
+            results.append(
+                self.service.handle(
+                    {
+                        "input_file": str(file),
+                        "output_file": str(
+                            output_dir / f"{file.name}{SPOOL_OUTPUT_SUFFIX}"
+                        ),
+                    }
+                )
+            )
+            self._done[file] = fingerprint
+        return results
+
+    def run(self, stop_event=None):
+        """Poll until stop_event is set.
+
+        Args:
+            stop_event (threading.Event, optional): event ending the loop
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+        while not stop_event.is_set():
+            self.poll()
+            stop_event.wait(self.poll_interval)
+
+
+def main(args=None):
+    """Run the service until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Keep unify resources warm and serve unify jobs."
+    )
+    parser.add_argument("--params", help="json file with default ursgal params")
+    parser.add_argument("--immutable-peptides", help="file with immutable peptides")
+    parser.add_argument("--socket", help="serve jobs on this Unix socket")
+    parser.add_argument("--port", type=int, help="serve jobs via HTTP on localhost")
+    parser.add_argument("--spool", help="watch this directory for engine outputs")
+    parser.add_argument("--output-dir", help="write spool results to this directory")
+    parser.add_argument(
+        "--output-root",
+        help="jobs may only write inside this directory, defaults to the output "
+        "or spool directory if given, else the working directory",
+    )
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args(args)
+    if args.socket is None and args.port is None and args.spool is None:
+        parser.error("Use at least one of --socket, --port or --spool.")
+
+    params = {}
+    if args.params is not None:
+        with open(args.params) as f:
+            params = json.load(f)
+    service = UnifyService(
+        params,
+        immutable_peptides=args.immutable_peptides,
+        output_root=args.output_root or args.output_dir or args.spool,
+    )
+    service.warm()
+
+    servers = []
+    if args.socket is not None:
+        servers.append(make_unix_server(service, args.socket))
+    if args.port is not None:
+        servers.append(make_http_server(service, port=args.port))
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    stop_event = threading.Event()
+    try:
+        if args.spool is not None:
+            SpoolWatcher(service, args.spool, args.output_dir, args.poll_interval).run(
+                stop_event
+            )
+        else:
+            stop_event.wait()
+    except KeyboardInterrupt:
+        stop_event.set()
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,84 @@
 """Parser handler."""
+import json
+from importlib.util import find_spec
+from pathlib import Path
 
-import uparma
+from unify_idents.utils import get_cache_dir, write_cache_file
+
+_header_translations = {}
+_param_mapper = None
+
+
+def _uparma_cache_version():
+    """Build a version tag which changes whenever the uparma data may have changed.
+
+    uparma itself is not imported.
+
+    Returns:
+        str: version tag
+    """
+    uparma_dir = Path(find_spec("uparma").origin).parent
+    version = []
+    for version_file in ["version.txt", "lib_version.txt"]:
+        version_file = uparma_dir / version_file
+        if version_file.exists():
+            version.append(version_file.read_text().strip())
+    parameter_json = uparma_dir / "parameters.json"
+    if parameter_json.exists():
+        stat = parameter_json.stat()
+        version += [str(stat.st_size), str(stat.st_mtime_ns)]
+    return "_".join(version)
+
+
+def get_param_mapper():
+    """Return the process-wide uparma mapper, loading it on first call.
+
+    Returns:
+        uparma.UParma: parameter mapper
+    """
+    global _param_mapper
+    if _param_mapper is None:
+        import uparma
+
+        _param_mapper = uparma.UParma()
+    return _param_mapper
+
+
+def get_header_translations(style):
+    """Return uparma header translations for a given engine style.
+
+    Translations are cached in memory and, if the cache directory is writable,
+    in a versioned json there, so uparma is only loaded for styles which were
+    never seen with the installed uparma version.
+
+    Args:
+        style (str): engine style, e.g. msfragger_style_3
+
+    Returns:
+        dict: unified column name to engine column name, must not be modified
+    """
+    if style in _header_translations:
+        return _header_translations[style]
+
+    cache_file = None
+    try:
+        cache_file = (
+            get_cache_dir()
+            / f"uparma_header_translations_{_uparma_cache_version()}.json"
+        )
+        with open(cache_file) as f:
+            translations = json.load(f)
+    except (OSError, ValueError):
+        translations = {}
+    if style not in translations:
+        translations[style] = get_param_mapper().get_default_params(style=style)[
+            "header_translations"
+        ]["translated_value"]
+        if cache_file is not None:
+            write_cache_file(cache_file, lambda f: json.dump(translations, f), mode="w")
+    _header_translations.update(translations)
+
+    return _header_translations[style]
 
 
 class BaseParser:
@@ -20,18 +98,55 @@ class BaseParser:
             params = {}
         self.params = params
         self.xml_file_list = self.params.get("xml_file_list", None)
-        self.param_mapper = uparma.UParma()
+        self._param_mapper = None
         self.style = None
 
+    @property
+    def param_mapper(self):
+        """Return uparma mapper, which is only loaded on first access.
+
+        Returns:
+            uparma.UParma: parameter mapper
+        """
+        if self._param_mapper is None:
+            self._param_mapper = get_param_mapper()
+        return self._param_mapper
+
+    def _get_mapping_dict(self):
+        """Map engine level column names to unified column names for self.style.
+
+        Returns:
+            dict: engine column name to unified column name
+        """
+        return {v: k for k, v in get_header_translations(self.style).items()}
+
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
         return False
+
+    @staticmethod
+    def _get_file_header(file, header=None):
+        """Return the shared file header, sniffing the file if none is given.
+
+        Args:
+            file (str): path to input file
+            header (FileHeader, optional): shared file header
+
+        Returns:
+            header (FileHeader): file header
+        """
+        if header is None:
+            from unify_idents.unify import sniff_file
+
+            header = sniff_file(file)
+        return header
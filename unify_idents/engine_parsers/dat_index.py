@@ -0,0 +1,61 @@
+"""Byte offset index of the MIME sections of Mascot .dat files.
+
+Sections are only decoded when needed, query sections are read by workers
+directly from a memory mapped file.
+"""
+import mmap
+import os
+
+import regex as re
+
+from unify_idents.utils import get_compression
+
+_boundary_pattern = re.compile(rb"boundary=\"?([^\"\s;]+)")
+_section_pattern = re.compile(
+    rb"Content-Type: application/x-Mascot; name=\"(?P<name>[^\"]+)\"\r?\n"
+)
+
+
+def index_sections(data):
+    """Find the byte ranges of all sections in .dat contents.
+
+    Args:
+        data (bytes-like): .dat file contents
+
+    Returns:
+        dict: section name to [start, end) byte range of its body, without
+            the closing boundary line
+    """
+    boundary = _boundary_pattern.search(data, 0, 4096)
+    delimiter = b"--" + (boundary.group(1) if boundary is not None else b"")
+    sections = {}
+    headers = list(_section_pattern.finditer(data))
+    for i, header in enumerate(headers):
+        next_start = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+        end = data.rfind(delimiter, header.end(), next_start)
+        if end == -1:
+            end = next_start
+        # The line break before the boundary belongs to the boundary
+        for line_break in (b"\n", b"\r"):
+            if end > header.end() and data[end - 1 : end] == line_break:
+                end -= 1
+        sections[header.group("name").decode()] = [header.end(), end]
+    return sections
+
+
+def build_dat_index(file):
+    """Index the sections of a .dat file via a memory map.
+
+    Args:
+        file (str): path to .dat file
+
+    Returns:
+        dict: section name to [start, end) byte range, see index_sections
+    """
+    if get_compression(file) is not None:
+        raise ValueError(f"Compressed file {file} cannot be indexed.")
+    with open(file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return index_sections(data)
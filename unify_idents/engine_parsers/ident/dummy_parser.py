@@ -14,11 +14,12 @@ class Dummy(IdentBaseParser):
         print("Miss Hoover, I glued my head to my shoulders.")
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
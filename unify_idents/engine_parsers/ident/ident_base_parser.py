@@ -1,21 +1,33 @@
 """Ident base parser class."""
-import multiprocessing as mp
+from pathlib import Path
 
-import ahocorasick
+import numpy as np
 import pandas as pd
 import regex as re
 from chemical_composition.chemical_composition_kb import PROTON
 from loguru import logger
-from peptide_mapper.mapper import UPeptideMapper
-from unimod_mapper.unimod_mapper import UnimodMapper
 
 from unify_idents.engine_parsers.base_parser import BaseParser
 from unify_idents.engine_parsers.misc import (
     get_composition_and_mass_and_accuracy,
+    get_peptide_automaton,
+    get_peptide_mapper,
+    get_unimod_mapper,
     init_custom_cc,
+    peptide_mapper_lock,
+    read_meta_info_lookup,
     trunc,
 )
-from unify_idents.utils import merge_and_join_dicts
+from unify_idents.executor import PSM_COMPOSITION_COST, get_executor
+from unify_idents.utils import (
+    get_compression,
+    join_consecutive,
+    merge_and_join_dicts,
+)
+
+RT_TRUNCATE_PRECISION = 2
+# XML inputs from this size on are streamed instead of parsed into one tree
+XML_STREAMING_MIN_SIZE = 64 * 1024**2
 
 
 class IdentBaseParser(BaseParser):
@@ -30,12 +42,12 @@ class IdentBaseParser(BaseParser):
         self.DELIMITER = self.params.get("delimiter", "<|>")
         self.PROTON = PROTON
         self.df = None
-        self.mod_mapper = UnimodMapper(xml_file_list=self.xml_file_list)
+        self.mod_mapper = get_unimod_mapper(xml_file_list=self.xml_file_list)
         self.params["mapped_mods"] = self.mod_mapper.map_mods(
             mod_list=self.params.get("modifications", [])
         )
         self.mod_dict = self._create_mod_dicts()
-        self.rt_truncate_precision = 2
+        self.rt_truncate_precision = RT_TRUNCATE_PRECISION
         self.reference_dict = {
             "exp_mz": None,
             "calc_mz": None,
@@ -127,6 +139,99 @@ class IdentBaseParser(BaseParser):
 
         return mod_dict
 
+    def _get_fixed_mod_strings(self, sequences, fixed_mods):
+        """Format the positions of fixed mods in all sequences.
+
+        Positions of all residues are found in one pass over a character array
+        of the distinct sequences, so each sequence is only processed once.
+
+        Args:
+            sequences (pd.Series): peptide sequences
+            fixed_mods (list): tuples of single residue and mod name
+
+        Returns:
+            (pd.Series): mod strings, mods in order of fixed_mods, then position
+        """
+        codes, unique_seqs = pd.factorize(sequences.fillna(""))
+        lengths = np.fromiter(map(len, unique_seqs), dtype=int, count=len(unique_seqs))
+        residues = np.frombuffer(
+            "".join(unique_seqs).encode("utf-32-le"), dtype=np.uint32
+        )
+        seq_index = np.repeat(np.arange(len(unique_seqs)), lengths)
+        positions = (
+            np.arange(len(residues))
+            - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            + 1
+        )
+
+        # Several fixed mods may target the same residue
+        mod_residues = np.array([ord(aa) for aa, _ in fixed_mods], dtype=np.uint32)
+        mod_order = np.argsort(mod_residues, kind="stable")
+        first = np.searchsorted(mod_residues[mod_order], residues, side="left")
+        n_mods = (
+            np.searchsorted(mod_residues[mod_order], residues, side="right") - first
+        )
+        hits = np.nonzero(n_mods)[0]
+        n_mods = n_mods[hits]
+        hit_index = np.repeat(hits, n_mods)
+        mod_index = mod_order[
+            np.repeat(first[hits], n_mods)
+            + np.arange(n_mods.sum())
+            - np.repeat(np.cumsum(n_mods) - n_mods, n_mods)
+        ]
+
+        order = np.lexsort((positions[hit_index], mod_index, seq_index[hit_index]))
+        hit_index = hit_index[order]
+        mod_index = mod_index[order]
+        names = np.array([name for _, name in fixed_mods], dtype=object)
+        entries = (
+            pd.Series(names[mod_index], dtype=object)
+            + ":"
+            + pd.Series(positions[hit_index], dtype=object).astype(str)
+        )
+        seqs, mod_strings = join_consecutive(seq_index[hit_index], entries, ";")
+        unique_strings = np.full(len(unique_seqs), "", dtype=object)
+        unique_strings[seqs] = mod_strings
+
+        return pd.Series(unique_strings[codes], index=sequences.index)
+
+    def _split_mod_strings(self, mods, sep, regex):
+        """Split the engine mod strings of all PSMs into single parsed mods.
+
+        Args:
+            mods (pd.Series): mod strings, one per PSM
+            sep (str): separator between single mods
+            regex (str): pattern with named groups, extracted from every single mod
+
+        Returns:
+            (pd.DataFrame): one row per mod in order of appearance, with the
+                groups of regex and the PSM position "psm"
+        """
+        mods = mods.fillna("").str.split(sep).reset_index(drop=True).explode()
+        mods = mods[mods.notna() & (mods != "")]
+        # Single mods repeat a lot, so only distinct ones are parsed
+        codes, unique_mods = pd.factorize(mods)
+        parsed = pd.Series(unique_mods, dtype=object).str.extract(regex)
+        mod_table = parsed.iloc[codes].reset_index(drop=True)
+        mod_table["psm"] = mods.index.to_numpy()
+        return mod_table
+
+    def _join_mod_strings(self, psms, mod_strings):
+        """Join formatted single mods into one mod string per PSM.
+
+        Args:
+            psms (array-like): PSM positions of the mods, consecutive per PSM
+            mod_strings (array-like): formatted single mods
+
+        Returns:
+            (pd.Series): mod strings aligned with self.df, empty for PSMs
+                without mods
+        """
+        psms, joined = join_consecutive(psms, mod_strings, ";")
+        mods_translated = np.full(len(self.df), "", dtype=object)
+        mods_translated[psms.astype(int)] = joined
+        return pd.Series(mods_translated, index=self.df.index)
+
     def clean_up_modifications(self):
         """Sanitizes modstrings generated by engine parsers.
 
@@ -189,8 +294,9 @@ class IdentBaseParser(BaseParser):
 
         Operations are performed inplace on self.df
         """
-        peptide_mapper = UPeptideMapper(self.params["database"])
-        mapped_peptides = peptide_mapper.map_peptides(self.df["sequence"].tolist())
+        peptide_mapper = get_peptide_mapper(self.params["database"])
+        with peptide_mapper_lock:
+            mapped_peptides = peptide_mapper.map_peptides(self.df["sequence"].tolist())
 
         peptide_mappings = [
             merge_and_join_dicts(mapped_peptides[seq], self.DELIMITER)
@@ -207,7 +313,8 @@ class IdentBaseParser(BaseParser):
         new_columns = pd.DataFrame(peptide_mappings)
         new_columns.rename(columns=columns_translations, inplace=True)
 
-        self.df.loc[:, new_columns.columns] = new_columns.values
+        # Columns are replaced, not set in place, as they may be categorical
+        self.df[new_columns.columns.tolist()] = new_columns.values
         new_columns = new_columns.dropna(axis=0, how="all")
         if len(new_columns) != len(self.df):
             logger.warning(
@@ -283,25 +390,23 @@ class IdentBaseParser(BaseParser):
         Offsets are calculated between theoretical and experimental mass-to-charge ratio.
         Operations are performed inplace on self.df
         """
-        with mp.Pool(
-            self.params.get("cpus", mp.cpu_count() - 1),
+        comp = get_executor(self.params).starmap(
+            get_composition_and_mass_and_accuracy,
+            zip(
+                self.df["sequence"].values,
+                self.df["modifications"].values,
+                self.df["charge"].astype(int).values,
+                self.df["exp_mz"].values,
+            ),
             initializer=init_custom_cc,
             initargs=(
                 get_composition_and_mass_and_accuracy,
                 self.params.get("xml_file_list", None),
                 self.PROTON,
             ),
-        ) as pool:
-            comp = pool.starmap(
-                get_composition_and_mass_and_accuracy,
-                zip(
-                    self.df["sequence"].values,
-                    self.df["modifications"].values,
-                    self.df["charge"].astype(int).values,
-                    self.df["exp_mz"].values,
-                ),
-                chunksize=1,
-            )
+            cost=PSM_COMPOSITION_COST,
+            mode=self.params.get("execution_mode", None),
+        )
         self.df.loc[:, ["chemical_composition", "ucalc_mass", "accuracy_ppm"]] = comp
         self.df.loc[:, "ucalc_mz"] = self._calc_mz(
             mass=self.df["ucalc_mass"], charge=self.df["charge"]
@@ -312,24 +417,46 @@ class IdentBaseParser(BaseParser):
             * 1e6
         )
 
+    def _use_xml_streaming(self):
+        """Decide whether the XML input is streamed instead of parsed at once.
+
+        params["xml_streaming"] forces the choice, otherwise inputs of at least
+        XML_STREAMING_MIN_SIZE bytes are streamed.
+
+        Returns:
+            bool: True if the input should be streamed
+        """
+        streaming = self.params.get("xml_streaming", None)
+        if streaming is None:
+            streaming = Path(self.input_file).stat().st_size >= XML_STREAMING_MIN_SIZE
+        return streaming
+
+    def _use_xml_index(self):
+        """Decide whether workers parse the XML input via a byte offset index.
+
+        params["xml_index"] forces the choice, otherwise the index is used for
+        inputs which would be streamed, see _use_xml_streaming. Compressed
+        inputs cannot be sliced and are never indexed.
+
+        Returns:
+            bool: True if the input should be parsed via the index
+        """
+        if get_compression(self.input_file) is not None:
+            return False
+        use_index = self.params.get("xml_index", None)
+        if use_index is None:
+            use_index = self._use_xml_streaming()
+        return use_index
+
     def _read_meta_info_lookup_file(self):
         """Read meta info lookup file.
 
         Returns:
             rt_lookup (pd.DataFrame): loaded rt_pickle_file indexable by Spectrum ID
         """
-        rt_lookup = pd.read_csv(self.params["rt_pickle_name"], compression="infer")
-        rt_lookup["rt_unit"] = rt_lookup["rt_unit"].replace(
-            {"second": 1, "minute": 60, "s": 1, "min": 60}
+        return read_meta_info_lookup(
+            self.params["rt_pickle_name"], self.rt_truncate_precision
         )
-        rt_lookup.set_index(
-            [
-                "spectrum_id",
-                rt_lookup["rt"].apply(trunc, args=(self.rt_truncate_precision,)),
-            ],
-            inplace=True,
-        )
-        return rt_lookup
 
     def get_meta_info(self):
         """Extract meta information.
@@ -412,6 +539,38 @@ class IdentBaseParser(BaseParser):
             + self.df["charge"].astype(str)
         )
 
+    def filter_ranks_and_scores(self):
+        """Drop PSMs beyond params["max_rank"] or not passing params["score_cutoff"].
+
+        Ranks are computed as in add_ranks. The score cutoff is a single value
+        or a dict keyed by engine name, scores equal to it pass. Runs before
+        all other processing steps, so they never see discarded PSMs.
+        Operations are performed inplace on self.df
+        """
+        max_rank = self.params.get("max_rank", None)
+        score_cutoff = self.params.get("score_cutoff", None)
+        if len(self.df) == 0 or (max_rank is None and score_cutoff is None):
+            return
+        eng_name = self.df["search_engine"].unique()[0]
+        if isinstance(score_cutoff, dict):
+            score_cutoff = score_cutoff.get(eng_name, None)
+        score_col = self.params["validation_score_field"][eng_name]
+        top_is_highest = self.params["bigger_scores_better"][eng_name]
+        scores = self.df[score_col].astype(float)
+        keep = pd.Series(True, index=self.df.index)
+        if score_cutoff is not None:
+            if top_is_highest is True:
+                keep &= scores >= score_cutoff
+            else:
+                keep &= scores <= score_cutoff
+        if max_rank is not None:
+            ranks = scores.groupby(self.df["spectrum_id"]).rank(
+                ascending=top_is_highest is not True, method="min"
+            )
+            keep &= ranks <= max_rank
+        if not keep.all():
+            self.df = self.df.loc[keep, :].reset_index(drop=True)
+
     def add_ranks(self):
         """Ranks are calculated based on the engine scoring column at Spectrum ID level.
 
@@ -438,10 +597,7 @@ class IdentBaseParser(BaseParser):
         decoy_tag = self.params.get("decoy_tag", "decoy_")
         self.df.loc[:, "is_decoy"] = self.df["protein_id"].str.contains(decoy_tag)
         if self.immutable_peptides is not None:
-            auto = ahocorasick.Automaton()
-            for seq in self.immutable_peptides:
-                auto.add_word(seq, seq)
-            auto.make_automaton()
+            auto = get_peptide_automaton(self.immutable_peptides)
             self.df.loc[:, "is_immutable"] = [
                 sum([len(match) for _, match in auto.iter_long(seq)]) == len(seq)
                 for seq in self.df["sequence"]
@@ -496,6 +652,7 @@ class IdentBaseParser(BaseParser):
         Operations are performed inplace on self.df
         """
         self.df.drop_duplicates(inplace=True, ignore_index=True)
+        self.filter_ranks_and_scores()
         self.clean_up_modifications()
         self.assert_only_iupac_and_missing_aas()
         self.add_protein_ids()
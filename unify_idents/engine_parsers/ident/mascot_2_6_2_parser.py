@@ -1,62 +1,70 @@
 """Engine parser."""
-import multiprocessing as mp
-
 import numpy as np
 import pandas as pd
 import regex as re
-import sys
-from itertools import repeat
 from loguru import logger
-from tqdm import tqdm
 
+from unify_idents.engine_parsers.dat_index import build_dat_index, index_sections
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
-from unify_idents.utils import merge_and_join_dicts
+from unify_idents.engine_parsers.xml_index import read_slices
+from unify_idents.utils import get_compression, open_input
 
+mascot_peptide_line_regex = re.compile(
+    r"^(?P<key>q[\d]+_p(?P<rank>[\d]+))(?P<subst>_subst)?=(?P<value>.+?)\r?$",
+    re.MULTILINE,
+)
+mascot_query_regexes = {
+    "spectrum_title": r"title=([^\r\n]+)",
+    "charge": r"charge=(\d+)",
+    "spectrum_id": r"scans=(\d+)",
+    "retention_time_seconds": r"rtinseconds=(\d+\.\d+)",
+}
 mascot_custom_psm_regex = re.compile(
     r"(?:[-+0-9]+),(?P<exp_mass>[0-9\.]+),(?:[-0-9\.]+),(?P<n_matched_ions>[0-9]+),(?P<seq>[A-Z]+),(?:[0-9]+),(?P<opt_mod_string>[0-9]+),(?P<score>[.0-9]+),(?:[0-9]+),(?:.+subst;)(?P<subst>.+)"
 )
-
-
-def _get_single_spec_df(reference_dict, spectrum):
-    """Primary method for reading and storing information from a single spectrum.
+# Unified column to group of mascot_custom_psm_regex
+mascot_psm_columns = {
+    "exp_mz": "exp_mass",
+    "mascot:num_matched_ions": "n_matched_ions",
+    "sequence": "seq",
+    "modifications": "opt_mod_string",
+    "mascot:score": "score",
+    "subst": "subst",
+}
+# Queries decoded and parsed at once
+QUERY_CHUNK_SIZE = 20000
+
+
+def _get_spectra_df(reference_dict, spectra):
+    """Read the PSMs of several spectra at once.
 
     Args:
         reference_dict (dict): dict with reference columns to be filled in
-        spectrum (tuple): spectrum data
+        spectra (list): spectrum data tuples of query name, query section and
+            PSM lines
 
     Returns:
-        (pd.DataFrame): dataframe for single spec id
-
+        (pd.DataFrame): one row per PSM
     """
-    spec_records = []
-    spec_level_dict = reference_dict.copy()
-    query, spec_level_info = spectrum[:2]
-
-    spec_level_dict["spectrum_title"] = re.search(
-        r"(?<=title=)(.+)", spec_level_info
-    ).group()
-    spec_level_dict["charge"] = re.search(r"(?<=charge=)(\d+)", spec_level_info).group()
-    spec_level_dict["spectrum_id"] = re.search(
-        r"(?<=scans=)(\d+)", spec_level_info
-    ).group()
-    spec_level_dict["retention_time_seconds"] = re.search(
-        r"(?<=rtinseconds=)(\d+\.\d+)", spec_level_info
-    ).group()
-
-    # Iterate children
-    for psm in spectrum[2]:
-        psm_level_dict = spec_level_dict.copy()
-        psm_level_info = re.search(mascot_custom_psm_regex, psm).groupdict()
-        psm_level_dict["exp_mz"] = psm_level_info["exp_mass"]
-        psm_level_dict["mascot:num_matched_ions"] = psm_level_info["n_matched_ions"]
-        psm_level_dict["sequence"] = psm_level_info["seq"]
-        psm_level_dict["modifications"] = psm_level_info["opt_mod_string"]
-        psm_level_dict["mascot:score"] = psm_level_info["score"]
-        psm_level_dict["subst"] = psm_level_info["subst"]
-
-        spec_records.append(psm_level_dict)
-
-    return pd.DataFrame(spec_records)
+    queries = pd.Series([spectrum[1] for spectrum in spectra], dtype=object)
+    psms = pd.Series([psm for spectrum in spectra for psm in spectrum[2]], dtype=object)
+    spec_index = np.repeat(
+        np.arange(len(spectra)), [len(spectrum[2]) for spectrum in spectra]
+    )
+    spec_level_info = pd.DataFrame(
+        {
+            column: queries.str.extract(pattern, expand=False)
+            for column, pattern in mascot_query_regexes.items()
+        }
+    )
+    psm_level_info = psms.str.extract(mascot_custom_psm_regex.pattern)
+
+    columns = {column: value for column, value in reference_dict.items()}
+    for column in mascot_query_regexes:
+        columns[column] = spec_level_info[column].to_numpy(dtype=object)[spec_index]
+    for column, group in mascot_psm_columns.items():
+        columns[column] = psm_level_info[group].to_numpy(dtype=object)
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(psms)))
 
 
 class Mascot_2_6_2_Parser(IdentBaseParser):
@@ -70,91 +78,94 @@ class Mascot_2_6_2_Parser(IdentBaseParser):
         super().__init__(*args, **kwargs)
         self.style = "mascot_style_1"
 
-        self.section_data, self.spectrum_data = self._get_data_on_spectrum_level()
+        self.spectrum_data = self._get_data_on_spectrum_level()
+        masses, header = self._read_sections(["masses", "header"])
         self.mods = {
-            "opt": dict(
-                re.findall(r"delta([\d]+)=[\d.]+,(\S*)", self.section_data["masses"])
-            ),
-            "fix": dict(
-                re.findall(
-                    r"FixedMod[\d]+=[\d.]+,(\S*)\s\((\w)\)", self.section_data["masses"]
-                )
-            ),
+            "opt": dict(re.findall(r"delta([\d]+)=[\d.]+,(\S*)", masses)),
+            "fix": dict(re.findall(r"FixedMod[\d]+=[\d.]+,(\S*)\s\((\w)\)", masses)),
         }
 
         self.reference_dict["search_engine"] = "mascot_" + re.search(
-            r"(?<=version=).*", self.section_data["header"]
+            r"(?<=version=)[^\r\n]*", header
         ).group().replace(".", "_")
         self.reference_dict["mascot:score"] = None
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        is_dat = file.as_posix().endswith(".dat")
-
-        with open(file.as_posix()) as f:
-            try:
-                head = "".join([next(f) for _ in range(5)])
-            except StopIteration:
-                head = ""
+        header = cls._get_file_header(file, header)
+        is_dat = header.format == "mascot_dat"
+        head = header.lines(5)
         contains_engine = "Mascot" in head
         return is_dat and contains_engine
 
-    def _get_data_on_spectrum_level(self):
-        """Provide aggregated data on spectrum level."""
-        with open(self.input_file) as f:
-            file_str = f.read()
+    def _read_sections(self, names):
+        """Decode sections of the .dat file.
 
-        file_section_pattern = re.compile(
-            r"(?:Content-Type: application/x-Mascot; name=\")([\w+]*)"
-        )
-        section_split = re.split(file_section_pattern, file_str)[1:]
-        section_data = {k: v for k, v in zip(section_split[::2], section_split[1::2])}
-
-        # Filters for non empty data and only respective _subst metainfo
-        filter_pattern = re.compile(r"q[\d]+_p[\d]+=(?!-1$).+|q[\d]+_p[\d]+_subst=.+")
-        peptide_data = dict(
-            [
-                peptide.split("=")
-                for peptide in section_data["peptides"].split("\n")[2:-2]
-                if re.match(filter_pattern, peptide)
-            ]
-        )
-        base_entries = {k: v for k, v in peptide_data.items() if "_subst" not in k}
-        subst_entries = {
-            k.rstrip("_subst"): v for k, v in peptide_data.items() if "_subst" in k
-        }
+        CRLF line endings are normalized to LF, as when reading in text mode.
 
-        peptide_data = merge_and_join_dicts(
-            [base_entries, subst_entries], delimiter=";subst;"
-        )
-        psm_info = pd.DataFrame(
-            peptide_data.values(), index=peptide_data.keys(), columns=["info"]
-        )
-        psm_info.index = psm_info.index.str.replace("q", "query")
-        psm_info.reset_index(inplace=True)
-        psm_info.groupby("index")["info"].apply(list).to_dict()
-        psm_info.loc[:, ["index", "psm"]] = (
-            psm_info["index"].str.split("_", expand=True).values
-        )
-        psm_info = psm_info.groupby("index")["info"].apply(list).to_dict()
+        Args:
+            names (list): section names
 
-        spectrum_info = {k: v for k, v in section_data.items() if k in psm_info}
-        spectrum_data = [
-            (k, v_section, psm_info[k]) for k, v_section in spectrum_info.items()
-        ]
+        Returns:
+            list: section contents as str
+        """
+        offsets = [self.sections[name] for name in names]
+        if self.dat_data is None:
+            slices = read_slices(self.input_file, offsets)
+        else:
+            slices = [self.dat_data[start:end] for start, end in offsets]
+        return [s.decode("utf-8").replace("\r\n", "\n") for s in slices]
 
-        section_data = {k: v for k, v in section_data.items() if "query" not in k}
+    def _get_data_on_spectrum_level(self):
+        """Provide aggregated data on spectrum level.
 
-        return section_data, spectrum_data
+        Only the section index is built here, query sections are decoded in
+        chunks by unify. Compressed inputs cannot be memory mapped and are
+        decompressed into memory instead.
+
+        Returns:
+            spectrum_data (list): tuples of query name and PSM lines
+        """
+        if get_compression(self.input_file) is None:
+            self.dat_data = None
+            self.sections = build_dat_index(self.input_file)
+        else:
+            with open_input(self.input_file) as f:
+                self.dat_data = f.read()
+            self.sections = index_sections(self.dat_data)
+
+        # Filters for non empty data, ranks up to max_rank and only respective
+        # _subst metainfo
+        max_rank = self.params.get("max_rank", None)
+        base_entries = {}
+        subst_entries = {}
+        (peptides,) = self._read_sections(["peptides"])
+        for match in mascot_peptide_line_regex.finditer(peptides):
+            if max_rank is not None and int(match.group("rank")) > max_rank:
+                continue
+            key = match.group("key")
+            if match.group("subst") is not None:
+                subst_entries[key] = match.group("value")
+            elif match.group("value") != "-1":
+                base_entries[key] = match.group("value")
+        psm_info = {}
+        for key, value in base_entries.items():
+            query = "query" + key.split("_")[0][1:]
+            psm_info.setdefault(query, []).append(
+                f"{value};subst;{subst_entries.get(key)}"
+            )
+
+        return [(name, psm_info[name]) for name in self.sections if name in psm_info]
 
     def _translate_opt_mods(self, raw_mod):
         """Replace internal modification nomenclature with formatted modification strings.
@@ -183,25 +194,11 @@ class Mascot_2_6_2_Parser(IdentBaseParser):
         Operations are performed inplace.
         """
         fix_mods = None
-        for name, aa in self.mods["fix"].items():
-            fm_strings = (
-                self.df["sequence"]
-                .str.split(aa)
-                .apply(
-                    lambda l: ";".join(
-                        [
-                            name + ":" + ind
-                            for ind in (
-                                np.cumsum(list(map(len, l[:-1]))) + range(1, len(l))
-                            ).astype(str)
-                        ]
-                    )
-                )
+        if len(self.mods["fix"]) > 0:
+            fix_mods = self._get_fixed_mod_strings(
+                self.df["sequence"],
+                [(aa, name) for name, aa in self.mods["fix"].items()],
             )
-            if fix_mods is None:
-                fix_mods = fm_strings
-            else:
-                fix_mods = fix_mods + ";" + fm_strings + ";"
 
         self.df.loc[:, "modifications"] = (
             self.df["modifications"].apply(self._translate_opt_mods).to_list()
@@ -231,23 +228,22 @@ class Mascot_2_6_2_Parser(IdentBaseParser):
         Returns:
             self.df (pd.DataFrame): unified dataframe
         """
-        logger.remove()
-        logger.add(lambda msg: tqdm.write(msg, end=""))
-        pbar_iterator = tqdm(
-            zip(
-                repeat(self.reference_dict),
-                self.spectrum_data,
-            ),
-            total=len(self.spectrum_data),
-        )
-        with mp.Pool(self.params.get("cpus", mp.cpu_count() - 1)) as pool:
-            chunk_dfs = pool.starmap(
-                _get_single_spec_df,
-                pbar_iterator,
+        spec_dfs = []
+        for i in range(0, len(self.spectrum_data), QUERY_CHUNK_SIZE):
+            chunk = self.spectrum_data[i : i + QUERY_CHUNK_SIZE]
+            sections = self._read_sections([query for query, _ in chunk])
+            spec_dfs.append(
+                _get_spectra_df(
+                    self.reference_dict,
+                    [
+                        (query, section, psms)
+                        for (query, psms), section in zip(chunk, sections)
+                    ],
+                )
             )
-        logger.remove()
-        logger.add(sys.stdout)
-        self.df = pd.concat(chunk_dfs, axis=0, ignore_index=True)
+        if len(spec_dfs) == 0:
+            spec_dfs.append(_get_spectra_df(self.reference_dict, []))
+        self.df = pd.concat(spec_dfs, ignore_index=True)
         self.df.loc[:, "spectrum_title"] = (
             self.df["spectrum_title"]
             .str.replace("%2e", ".", regex=False)
@@ -4,6 +4,11 @@ import regex as re
 
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
 
+# Single mod, e.g. C3(Carbamidomethyl|57.021464|fixed) or N-Term(Acetyl|...)
+msamanda_mod_regex = re.compile(
+    r"^(?P<site>[^(\d]*)(?P<pos>\d*)[^(]*\((?P<name>[^|)]+)"
+)
+
 
 class MSAmanda_2_Parser(IdentBaseParser):
     """File parser for MS Amanda 2."""
@@ -18,13 +23,11 @@ class MSAmanda_2_Parser(IdentBaseParser):
 
         self.df = pd.read_csv(self.input_file, delimiter="\t", skiprows=1)
         self.df.dropna(axis=1, how="all", inplace=True)
+        max_rank = self.params.get("max_rank", None)
+        if max_rank is not None and "Rank" in self.df.columns:
+            self.df = self.df.loc[self.df["Rank"] <= max_rank, :].reset_index(drop=True)
 
-        self.mapping_dict = {
-            v: k
-            for k, v in self.param_mapper.get_default_params(style=self.style)[
-                "header_translations"
-            ]["translated_value"].items()
-        }
+        self.mapping_dict = self._get_mapping_dict()
         self.df.rename(columns=self.mapping_dict, inplace=True)
         self.df.columns = self.df.columns.str.lstrip(" ")
         if not "modifications" in self.df.columns:
@@ -43,47 +46,23 @@ class MSAmanda_2_Parser(IdentBaseParser):
         self.reference_dict.update({k: None for k in self.mapping_dict.values()})
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        # It is a csv file even though it is technically tab-delimited
-        is_csv = file.as_posix().endswith(".csv")
-        with open(file.as_posix()) as f:
-            try:
-                head = "".join([next(f) for _ in range(1)])
-            except StopIteration:
-                head = ""
+        # Usually named .csv even though it is technically tab-delimited
+        header = cls._get_file_header(file, header)
+        is_tsv = header.format == "tsv"
+        head = header.lines(1)
         matches_version = "#version: 2." in head
-        return is_csv and matches_version
-
-    def _map_mod_translation(self, row):
-        """Replace single mod string.
-
-        Args:
-            row (str): unprocessed modification string
-
-        Returns:
-            mod_str (str): formatted modification string
-        """
-        mod_str = ""
-        if row == "" or row == [""]:
-            return mod_str
-        for mod in row:
-            mod_name = re.search(r"\(([^|]+)", mod).group(1)
-            pos = mod.split("(")[0]
-            if "N-TERM" in pos.upper():
-                pos = 0
-            else:
-                pos = int(re.search(r"\d+", mod).group(0))
-            mod_str += f"{mod_name}:{pos};"
-        return mod_str
+        return is_tsv and matches_version
 
     def translate_mods(self):
         """
@@ -92,10 +71,13 @@ class MSAmanda_2_Parser(IdentBaseParser):
         Returns:
             (pd.Series): column with formatted mod strings
         """
-        mod_split_col = self.df["modifications"].fillna("").str.split(";")
-        mods_translated = mod_split_col.apply(self._map_mod_translation)
+        mod_table = self._split_mod_strings(
+            self.df["modifications"], ";", msamanda_mod_regex.pattern
+        )
+        is_n_term = mod_table["site"].str.upper().str.contains("N-TERM", regex=False)
+        pos = mod_table["pos"].where(~is_n_term.astype(bool), "0")
 
-        return mods_translated.str.rstrip(";")
+        return self._join_mod_strings(mod_table["psm"], mod_table["name"] + ":" + pos)
 
     def unify(self):
         """
@@ -1,10 +1,35 @@
 """Engine parser."""
-import itertools
+import numpy as np
 import pandas as pd
-import regex as re
 from loguru import logger
 
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
+from unify_idents.engine_parsers.table_reader import read_table
+
+# Engine level dtypes, dtypes of columns not listed are inferred. Scores and
+# masses stay float64 to keep all digits of the input.
+COLUMN_DTYPES = {
+    "scannum": "int32",
+    "precursor_neutral_mass": "float64",
+    "retention_time": "float64",
+    "charge": "int32",
+    "hit_rank": "int32",
+    "peptide_prev_aa": "category",
+    "peptide_next_aa": "category",
+    "num_matched_ions": "int32",
+    "tot_num_ions": "int32",
+    "calc_neutral_pep_mass": "float64",
+    "massdiff": "float64",
+    "num_tol_term": "int32",
+    "num_missed_cleavages": "int32",
+    "hyperscore": "float64",
+    "nextscore": "float64",
+    "expectscore": "float64",
+    "score_without_delta_mass": "float64",
+    "best_score_with_delta_mass": "float64",
+    "second_best_score_with_delta_mass": "float64",
+    "delta_score": "float64",
+}
 
 
 class MSFragger_3_Parser(IdentBaseParser):
@@ -21,15 +46,24 @@ class MSFragger_3_Parser(IdentBaseParser):
         if self.params.get("label", "") == "15N":
             raise NotImplementedError
 
-        self.df = pd.read_csv(self.input_file, delimiter="\t")
+        self.mapping_dict = self._get_mapping_dict()
+        row_filter = None
+        max_rank = self.params.get("max_rank", None)
+        if max_rank is not None and "hit_rank" in self.mapping_dict:
+            row_filter = lambda chunk: chunk["hit_rank"] <= max_rank
+        # Only mapped columns and ranks up to max_rank are read, all other
+        # columns are dropped in sanitize
+        self.df = read_table(
+            self.input_file,
+            delimiter="\t",
+            columns=self.mapping_dict.keys(),
+            dtypes=COLUMN_DTYPES,
+            engine=self.params.get("csv_engine", None),
+            chunk_size=self.params.get("csv_chunk_size", None),
+            row_filter=row_filter,
+        )
         self.df.dropna(axis=1, how="all", inplace=True)
 
-        self.mapping_dict = {
-            v: k
-            for k, v in self.param_mapper.get_default_params(style=self.style)[
-                "header_translations"
-            ]["translated_value"].items()
-        }
         self.df.rename(columns=self.mapping_dict, inplace=True)
         self.df.columns = self.df.columns.str.lstrip(" ")
         if not "modifications" in self.df.columns:
@@ -37,22 +71,20 @@ class MSFragger_3_Parser(IdentBaseParser):
         self.reference_dict.update({k: None for k in self.mapping_dict.values()})
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        is_tsv = file.as_posix().endswith(".tsv")
-        with open(file.as_posix()) as f:
-            try:
-                head = "".join([next(f) for _ in range(1)])
-            except StopIteration:
-                head = ""
+        header = cls._get_file_header(file, header)
+        is_tsv = header.format == "tsv"
+        head = header.lines(1)
         head = set(head.rstrip("\n").split("\t"))
         ref_columns = {
             "scannum",
@@ -83,32 +115,54 @@ class MSFragger_3_Parser(IdentBaseParser):
         columns_match = len(ref_columns.difference(head)) == 0
         return is_tsv and columns_match
 
-    def _map_mod_translation(self, row, map_dict):
-        """Replace single mod string.
+    def _split_mods(self):
+        """Split the modification strings of all PSMs into single mods.
+
+        Returns:
+            (pd.DataFrame): one row per mod with PSM position "psm", sequence
+                position "pos" and mass string "mass" in order of appearance
+        """
+        return self._split_mod_strings(
+            self.df["modifications"], ", ", r"^(?P<pos>\d*)[^(]*\((?P<mass>[^)]+)"
+        )
+
+    def _map_mod_translations(self, mod_table, map_dict):
+        """Replace mod strings of all PSMs.
 
         Args:
-            row (str): unprocessed modification string
-            map_dict (dict): mod mapping dict
+            mod_table (pd.DataFrame): single mods, see _split_mods
+            map_dict (dict): mod mapping dict, mass to names
 
         Returns:
-            mod_str (str): formatted modification string
+            (pd.Series): formatted modification strings, NON_MAPPABLE for PSMs
+                with modifications without names
         """
-        mod_str = ""
-        if row == "" or row == [""]:
-            return mod_str
-        for mod in row:
-            mass = re.search(r"\(([^)]+)", mod).group(1)
-            name = map_dict[mass]
-            if len(name) > 0:
-                for m in name:
-                    if any(["N-term" in p for p in self.mod_dict[m]["position"]]):
-                        pos = 0
-                    else:
-                        pos = int(re.search(r"^\d+", mod).group(0))
-                    mod_str += f"{m}:{pos};"
-            else:
-                return "NON_MAPPABLE"
-        return mod_str
+        name_table = pd.DataFrame(
+            [
+                (mass, name, i)
+                for mass, names in map_dict.items()
+                for i, name in enumerate(names)
+            ],
+            columns=["mass", "name", "name_order"],
+        )
+        n_term = {
+            name: any(["N-term" in p for p in self.mod_dict[name]["position"]])
+            for name in name_table["name"].unique()
+        }
+        mod_table = mod_table.assign(order=np.arange(len(mod_table)))
+        mod_table = mod_table.merge(name_table, on="mass", how="left").sort_values(
+            ["order", "name_order"], kind="stable"
+        )
+
+        non_mappable = mod_table.loc[mod_table["name"].isna(), "psm"].unique()
+        mod_table = mod_table.loc[~mod_table["psm"].isin(non_mappable), :]
+        pos = mod_table["pos"].where(~mod_table["name"].map(n_term).astype(bool), "0")
+        mods_translated = self._join_mod_strings(
+            mod_table["psm"], mod_table["name"] + ":" + pos
+        )
+        mods_translated.iloc[non_mappable.astype(int)] = "NON_MAPPABLE"
+
+        return mods_translated
 
     def translate_mods(self):
         """
@@ -117,9 +171,8 @@ class MSFragger_3_Parser(IdentBaseParser):
         Returns:
             (pd.Series): column with formatted mod strings
         """
-        mod_split_col = self.df["modifications"].fillna("").str.split(", ")
-        unique_mods = set().union(*mod_split_col.apply(set)).difference({""})
-        unique_mod_masses = {re.search(r"\(([^)]+)", m).group(1) for m in unique_mods}
+        mod_table = self._split_mods()
+        unique_mod_masses = mod_table["mass"].dropna().unique()
         # Map single mods
         potential_names = {
             m: [
@@ -141,24 +194,11 @@ class MSFragger_3_Parser(IdentBaseParser):
                 ]
                 if len(potential_mods) == 1:
                     potential_names[unmapped_mass] = potential_mods[0]
-        non_mappable_mods = {
-            k: len(
-                [
-                    m
-                    for m in list(
-                        itertools.chain.from_iterable(
-                            mod_split_col.apply(list).to_list()
-                        )
-                    )
-                    if k in m
-                ]
-            )
-            for k, v in potential_names.items()
-            if v == []
-        }
-        non_mappable_percent = pd.Series(
-            [v / len(self.df) for v in non_mappable_mods.values()], dtype="float64"
-        )
+        # Occurrences of each modification without names
+        unmapped_masses = [k for k, v in potential_names.items() if len(v) == 0]
+        non_mappable_percent = mod_table.loc[
+            mod_table["mass"].isin(unmapped_masses), "mass"
+        ].value_counts() / len(self.df)
         if any(non_mappable_percent > 0.001):
             raise ValueError(
                 "Some modifications found in more than 0.1% of PSMs cannot be mapped."
@@ -167,11 +207,7 @@ class MSFragger_3_Parser(IdentBaseParser):
             logger.warning(
                 "Some modifications found in less than 0.1% of PSMs cannot be mapped and were removed."
             )
-        mods_translated = mod_split_col.apply(
-            self._map_mod_translation, map_dict=potential_names
-        )
-
-        return mods_translated.str.rstrip(";")
+        return self._map_mod_translations(mod_table, potential_names)
 
     def unify(self):
         """
@@ -1,6 +1,5 @@
 """Engine parser."""
 
-import numpy as np
 import pandas as pd
 
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
@@ -19,12 +18,7 @@ class Omssa_Parser(IdentBaseParser):
 
         self.df = pd.read_csv(self.input_file)
 
-        self.mapping_dict = {
-            v: k
-            for k, v in self.param_mapper.get_default_params(style=self.style)[
-                "header_translations"
-            ]["translated_value"].items()
-        }
+        self.mapping_dict = self._get_mapping_dict()
         self.df.rename(columns=self.mapping_dict, inplace=True)
         self.df.columns = self.df.columns.str.lstrip(" ")
         self.df.drop(
@@ -40,22 +34,20 @@ class Omssa_Parser(IdentBaseParser):
         self.reference_dict.update({k: None for k in self.mapping_dict.values()})
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        is_csv = file.as_posix().endswith(".csv")
-        with open(file.as_posix()) as f:
-            try:
-                head = "".join([next(f) for _ in range(1)])
-            except StopIteration:
-                head = ""
+        header = cls._get_file_header(file, header)
+        is_csv = header.format == "csv"
+        head = header.lines(1)
         head = set(head.rstrip("\n").split(","))
         ref_columns = {
             "Spectrum number",
@@ -77,33 +69,6 @@ class Omssa_Parser(IdentBaseParser):
         columns_match = len(ref_columns.difference(head)) == 0
         return is_csv and columns_match
 
-    def _replace_mod_strings(self, row, mod_translations):
-        """Replace single mod string.
-
-        Args:
-            row (str): unprocessed modification string
-            mod_translations (dict): mod translation dict
-
-        Returns:
-            mod_str (str): formatted modification string
-        """
-        if row == "":
-            return ""
-        mods = row.split(" ,")
-        new_modstring = ""
-        for m in mods:
-            omssa_name, pos = m.split(":")
-            unimod_name = mod_translations[omssa_name]["unimod_name"]
-            if pos == "1" and any(
-                [
-                    ("N-term" in target)
-                    for target in mod_translations[omssa_name]["aa_targets"]
-                ]
-            ):
-                pos = "0"
-            new_modstring += f"{unimod_name}:{pos};"
-        return new_modstring.rstrip(";")
-
     def translate_mods(self):
         """
         Replace internal modification nomenclature with formatted modification strings.
@@ -114,34 +79,17 @@ class Omssa_Parser(IdentBaseParser):
         self.df["modifications"] = (
             self.df["modifications"].fillna("").str.replace(" ,", ";")
         )
-        fix_mods = None
         # Map fixed mods
-        fixed_mod_types = [
-            d for d in self.params["modifications"] if d["type"] == "fix"
+        fixed_mods = [
+            (d["aa"], d["name"])
+            for d in self.params["modifications"]
+            if d["type"] == "fix"
         ]
-        for fm in fixed_mod_types:
-            fm_strings = (
-                self.df["sequence"]
-                .str.split(fm["aa"])
-                .apply(
-                    lambda l: ";".join(
-                        [
-                            fm["name"] + ":" + ind
-                            for ind in (
-                                np.cumsum(list(map(len, l[:-1]))) + range(1, len(l))
-                            ).astype(str)
-                        ]
-                    )
-                )
-            )
-            if fix_mods is None:
-                fix_mods = fm_strings
-            else:
-                fix_mods = fix_mods + ";" + fm_strings
-
-        if fix_mods is not None:
+        if len(fixed_mods) > 0:
             self.df["modifications"] = (
-                self.df["modifications"].fillna("") + ";" + fix_mods
+                self.df["modifications"]
+                + ";"
+                + self._get_fixed_mod_strings(self.df["sequence"], fixed_mods)
             )
 
     def unify(self):
@@ -1,7 +1,9 @@
 """Engine parser."""
-import multiprocessing as mp
+from functools import partial
 from io import BytesIO
+from itertools import chain
 
+import numpy as np
 import pandas as pd
 import regex as re
 from loguru import logger
@@ -9,6 +11,13 @@ from lxml import etree
 from tqdm import tqdm
 
 from unify_idents.engine_parsers.ident.ident_base_parser import IdentBaseParser
+from unify_idents.engine_parsers.psm_batch import batches_to_df, rows_to_batch
+from unify_idents.engine_parsers.xml_index import get_xml_index, parse_slices
+from unify_idents.executor import get_executor
+from unify_idents.utils import get_compression, open_input
+
+SPECTRUM_BATCH_SIZE = 256
+VERSION_TAIL_BYTES = 65536
 
 
 def _mp_specs_init(func, reference_dict, mapping_dict):
@@ -16,29 +25,25 @@ def _mp_specs_init(func, reference_dict, mapping_dict):
     func.mapping_dict = mapping_dict
 
 
-def _get_single_spec_df(spectrum):
-    """Primary method for reading and storing information from a single spectrum.
+def _get_single_spec_records(spectrum, reference_dict, mapping_dict):
+    """Read the PSMs of a single spectrum.
 
-    Attributes:
+    Args:
+        spectrum (bytes or lxml.etree._Element): (serialized) spectrum group
+            with potentially multiple PSMs
         reference_dict (dict): dict with reference columns to be filled in
         mapping_dict (dict): mapping of engine level column names to ursgal unified column names
 
-    Args:
-        spectrum (xml Element): namespace of single spectrum with potentially multiple PSMs
-
     Returns:
-        (pd.DataFrame): dataframe containing spectrum information
-
+        (list): one dict per PSM, None if the group is no spectrum
     """
-    spectrum = etree.parse(BytesIO(spectrum)).getroot()
+    if isinstance(spectrum, bytes):
+        spectrum = etree.parse(BytesIO(spectrum)).getroot()
     spec_records = []
-    spec_level_dict = _get_single_spec_df.reference_dict.copy()
-    spec_level_info = _get_single_spec_df.mapping_dict.keys() & spectrum.attrib.keys()
+    spec_level_dict = reference_dict.copy()
+    spec_level_info = mapping_dict.keys() & spectrum.attrib.keys()
     spec_level_dict.update(
-        {
-            _get_single_spec_df.mapping_dict[k]: spectrum.attrib[k]
-            for k in spec_level_info
-        }
+        {mapping_dict[k]: spectrum.attrib[k] for k in spec_level_info}
     )
 
     if "z" not in spectrum.attrib:
@@ -53,10 +58,8 @@ def _get_single_spec_df(spectrum):
 
         psm_level_dict["calc_mz"] = psm.attrib["mh"]
 
-        psm_level_info = _get_single_spec_df.mapping_dict.keys() & psm.attrib.keys()
-        psm_level_dict.update(
-            {_get_single_spec_df.mapping_dict[k]: psm.attrib[k] for k in psm_level_info}
-        )
+        psm_level_info = mapping_dict.keys() & psm.attrib.keys()
+        psm_level_dict.update({mapping_dict[k]: psm.attrib[k] for k in psm_level_info})
 
         # Record modifications
         mods = []
@@ -69,7 +72,116 @@ def _get_single_spec_df(spectrum):
         psm_level_dict["modifications"] = mods
 
         spec_records.append(psm_level_dict)
-    return pd.DataFrame(spec_records)
+    return spec_records
+
+
+def _get_spec_batch(spectra):
+    """Read a contiguous batch of spectra into one columnar PSM batch.
+
+    Attributes:
+        reference_dict (dict): dict with reference columns to be filled in
+        mapping_dict (dict): mapping of engine level column names to ursgal unified column names
+
+    Args:
+        spectra (list): serialized spectrum groups
+
+    Returns:
+        (dict): PSM batch of all spectra, see psm_batch
+    """
+    rows = []
+    for spectrum in spectra:
+        spec_records = _get_single_spec_records(
+            spectrum, _get_spec_batch.reference_dict, _get_spec_batch.mapping_dict
+        )
+        rows.extend(spec_records or [])
+    return rows_to_batch(rows)
+
+
+def _get_indexed_spec_batch(input_file, namespaces, encoding, offsets):
+    """Read a contiguous batch of spectra directly from the input file.
+
+    Attributes:
+        reference_dict (dict): dict with reference columns to be filled in
+        mapping_dict (dict): mapping of engine level column names to ursgal unified column names
+
+    Args:
+        input_file (str): path to X!Tandem output
+        namespaces (str): namespace declarations of the root element
+        encoding (str): encoding of the input file
+        offsets (list): byte ranges of the spectrum groups, see xml_index
+
+    Returns:
+        (dict): PSM batch of all spectra, see psm_batch
+    """
+    rows = []
+    for spectrum in parse_slices(input_file, offsets, namespaces, encoding):
+        spec_records = _get_single_spec_records(
+            spectrum,
+            _get_indexed_spec_batch.reference_dict,
+            _get_indexed_spec_batch.mapping_dict,
+        )
+        rows.extend(spec_records or [])
+    return rows_to_batch(rows)
+
+
+def read_xtandem_version(file):
+    """Read the X!Tandem version without parsing the whole file.
+
+    The performance parameters are written at the end of the file, so only its
+    tail is searched. Falls back to a streaming pass if they are not found there
+    or the file is compressed.
+
+    Args:
+        file (str): path to X!Tandem output
+
+    Returns:
+        str: value of the "process, version" note
+    """
+    if get_compression(file) is None:
+        version_pattern = re.compile(r'label="process, version">([^<]*)<')
+        with open(file, "rb") as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - VERSION_TAIL_BYTES))
+            match = version_pattern.search(f.read().decode(errors="replace"))
+        if match is not None:
+            return match.group(1)
+    with open_input(file) as f:
+        for _, note in etree.iterparse(f, events=("end",), tag="note"):
+            if note.attrib.get("label") == "process, version":
+                return note.text
+            note.clear()
+    return None
+
+
+def iter_spectrum_batches(file, batch_size=SPECTRUM_BATCH_SIZE):
+    """Stream serialized spectrum groups of an X!Tandem output in batches.
+
+    Processed elements are cleared, so memory does not grow with file size.
+
+    Args:
+        file (str): path to X!Tandem output
+        batch_size (int, optional): spectra per batch
+
+    Yields:
+        list: serialized spectrum groups
+    """
+    batch = []
+    with open_input(file) as f:
+        for _, element in etree.iterparse(f, events=("end",), tag="group"):
+            parent = element.getparent()
+            # Spectra are the top level groups, nested groups belong to them
+            if parent is None or parent.getparent() is not None:
+                continue
+            if "z" in element.attrib:
+                batch.append(etree.tostring(element))
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if len(batch) > 0:
+        yield batch
 
 
 class XTandemAlanine_Parser(IdentBaseParser):
@@ -82,44 +194,38 @@ class XTandemAlanine_Parser(IdentBaseParser):
         """
         super().__init__(*args, **kwargs)
         self.style = "xtandem_style_1"
-        tree = etree.parse(self.input_file)
-        self.root = tree.getroot()
+        self.indexed = self._use_xml_index()
+        self.streaming = self._use_xml_streaming()
+        if self.indexed is True or self.streaming is True:
+            self.root = None
+            version = read_xtandem_version(self.input_file)
+        else:
+            with open_input(self.input_file) as f:
+                self.root = etree.parse(f).getroot()
+            version = self.root.find(
+                './/*[@label="performance parameters"]/*[@label="process, version"]'
+            ).text
         self.reference_dict["search_engine"] = (
-            "xtandem_"
-            + re.search(
-                r"(?<=Tandem )\w+",
-                self.root.find(
-                    './/*[@label="performance parameters"]/*[@label="process, version"]'
-                ).text,
-            )
-            .group()
-            .lower()
+            "xtandem_" + re.search(r"(?<=Tandem )\w+", version).group().lower()
         )
-        self.mapping_dict = {
-            v: k
-            for k, v in self.param_mapper.get_default_params(style=self.style)[
-                "header_translations"
-            ]["translated_value"].items()
-        }
+        self.mapping_dict = self._get_mapping_dict()
         self.reference_dict.update({k: None for k in self.mapping_dict.values()})
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        is_xml = file.as_posix().endswith(".xml")
-        with open(file.as_posix()) as f:
-            try:
-                head = "".join([next(f) for _ in range(10)])
-            except StopIteration:
-                head = ""
+        header = cls._get_file_header(file, header)
+        is_xml = header.format == "xml"
+        head = header.lines(10)
         contains_ref = "tandem-style.xsl" in head
 
         return is_xml and contains_ref
@@ -127,6 +233,9 @@ class XTandemAlanine_Parser(IdentBaseParser):
     def map_mod_names(self, df):
         """Map modification names in unify style.
 
+        Modifications are exploded into a table with one row per PSM, mod and
+        candidate name, so every pair is resolved once.
+
         Args:
             df (pd.DataFrame): input dataframe
 
@@ -134,44 +243,68 @@ class XTandemAlanine_Parser(IdentBaseParser):
             df (pd.DataFrame): dataframe with processed modification column
 
         """
-        unique_mods = set().union(*df["modifications"].apply(set).values)
-        unique_mod_masses = {m.split(":")[0] for m in unique_mods}
-        potential_names = {
-            m: [
-                name
-                for name in self.mod_mapper.mass_to_names(float(m), decimals=4)
+        mods = df["modifications"].to_list()
+        mod_table = pd.DataFrame(
+            {
+                "psm": np.repeat(np.arange(len(mods)), [len(m) for m in mods]),
+                "mod": pd.Series(list(chain.from_iterable(mods)), dtype=object),
+            }
+        ).drop_duplicates()
+        mod_table["order"] = np.arange(len(mod_table))
+        mod_table["mass"] = mod_table["mod"].map(lambda m: m.split(":")[0])
+        mod_table["pos"] = mod_table["mod"].map(lambda m: m.split(":")[1]).astype(int)
+
+        potential_names = pd.DataFrame(
+            [
+                (mass, name)
+                for mass in mod_table["mass"].unique()
+                for name in self.mod_mapper.mass_to_names(float(mass), decimals=4)
                 if name in self.mod_dict
-            ]
-            for m in unique_mod_masses
+            ],
+            columns=["mass", "name"],
+            dtype=object,
+        )
+        # Mods without candidate names are dropped
+        mod_table = mod_table.merge(potential_names, on="mass", sort=False)
+
+        sequences = df["sequence"].to_numpy()[mod_table["psm"].to_numpy()]
+        # TODO: Is position 'any' respected here
+        mod_table["in_seq"] = [
+            -len(seq) <= pos < len(seq) and seq[pos] in self.mod_dict[name]["aa"]
+            for seq, pos, name in zip(sequences, mod_table["pos"], mod_table["name"])
+        ]
+        n_term_names = {
+            name
+            for name, mod in self.mod_dict.items()
+            if {"N-term", "Prot-N-term"} & mod["position"]
         }
-        mod_translation = {}
-        new_mods = pd.Series("", index=df.index)
-        for m in unique_mods:
-            mass, pos = m.split(":")
-            potential_mods = potential_names[mass]
-            if len(potential_mods) == 0:
-                mod_translation[m] = None
-            else:
-                for name in potential_mods:
-                    # TODO: Is position 'any' respected here
-                    in_seq = df["sequence"].str[int(pos)].isin(
-                        self.mod_dict[name]["aa"]
-                    ) & df["modifications"].str.join("|").str.contains(m)
-                    n_term = (~in_seq) & (
-                        (
-                            ("N-term" in self.mod_dict[name]["position"])
-                            | ("Prot-N-term" in self.mod_dict[name]["position"])
-                        )
-                        & df["modifications"].str.join("|").str.contains(m)
-                    )
-                    if in_seq.sum() != 0:
-                        new_mods.loc[in_seq] += f"{name}:{int(pos)+1};"
-                    elif n_term.sum() != 0:
-                        new_mods.loc[n_term] += f"{name}:0;"
-                    else:
-                        logger.error(f"Modification {name} could not be mapped.")
-                        raise KeyError
-        df["modifications"] = new_mods.str.rstrip(";")
+        mod_table["n_term"] = ~mod_table["in_seq"] & mod_table["name"].isin(
+            n_term_names
+        )
+
+        # Each mod and name is placed in sequence if possible for any PSM,
+        # otherwise at the N-terminus
+        groups = mod_table.groupby(["mod", "name"], sort=False)
+        any_in_seq = groups["in_seq"].transform("any")
+        unmapped = ~any_in_seq & ~groups["n_term"].transform("any")
+        if unmapped.any():
+            name = mod_table.loc[unmapped, "name"].iloc[0]
+            logger.error(f"Modification {name} could not be mapped.")
+            raise KeyError
+        mod_table = mod_table[mod_table["in_seq"] | (~any_in_seq & mod_table["n_term"])]
+
+        mod_table = mod_table.sort_values(["psm", "order"], kind="stable")
+        mod_strings = (
+            mod_table["name"]
+            + ":"
+            + np.where(mod_table["in_seq"], mod_table["pos"] + 1, 0).astype(str)
+        )
+        new_mods = mod_strings.groupby(mod_table["psm"].to_numpy()).agg(";".join)
+        df["modifications"] = (
+            pd.Series(new_mods, index=range(len(df)), dtype=object)
+            .fillna("")
+            .to_numpy()
+        )
 
         return df
 
@@ -182,20 +315,64 @@ class XTandemAlanine_Parser(IdentBaseParser):
         Returns:
             self.df (pd.DataFrame): unified dataframe
         """
-        self.root = [etree.tostring(e) for e in self.root]
         logger.remove()
         logger.add(lambda msg: tqdm.write(msg, end=""))
-        with mp.Pool(
-            self.params.get("cpus", mp.cpu_count() - 1),
-            initializer=_mp_specs_init,
-            initargs=(_get_single_spec_df, self.reference_dict, self.mapping_dict),
-        ) as pool:
-            chunk_dfs = pool.map(
-                _get_single_spec_df,
-                tqdm(self.root),
-            )
-        chunk_dfs = [df for df in chunk_dfs if not df is None]
-        self.df = pd.concat(chunk_dfs, axis=0, ignore_index=True)
+        batch_size = self.params.get("spectrum_batch_size", None)
+        with tqdm(unit="spectrum") as progress:
+            if self.indexed is True:
+                index = get_xml_index(self.input_file, "group", attribute="z")
+                progress.total = len(index["offsets"])
+                spec_batches = get_executor(self.params).map_batches(
+                    partial(
+                        _get_indexed_spec_batch,
+                        str(self.input_file),
+                        index["namespaces"],
+                        index["encoding"],
+                    ),
+                    index["offsets"],
+                    initializer=_mp_specs_init,
+                    initargs=(
+                        _get_indexed_spec_batch,
+                        self.reference_dict,
+                        self.mapping_dict,
+                    ),
+                    batch_size=batch_size,
+                    mode=self.params.get("execution_mode", None),
+                    progress=progress,
+                )
+            elif self.streaming is True:
+                spec_batches = get_executor(self.params).imap_batches(
+                    _get_spec_batch,
+                    iter_spectrum_batches(
+                        self.input_file, batch_size or SPECTRUM_BATCH_SIZE
+                    ),
+                    initializer=_mp_specs_init,
+                    initargs=(
+                        _get_spec_batch,
+                        self.reference_dict,
+                        self.mapping_dict,
+                    ),
+                    mode=self.params.get("execution_mode", None),
+                    batched=True,
+                    progress=progress,
+                )
+            else:
+                self.root = [etree.tostring(e) for e in self.root]
+                progress.total = len(self.root)
+                spec_batches = get_executor(self.params).map_batches(
+                    _get_spec_batch,
+                    self.root,
+                    initializer=_mp_specs_init,
+                    initargs=(
+                        _get_spec_batch,
+                        self.reference_dict,
+                        self.mapping_dict,
+                    ),
+                    batch_size=batch_size,
+                    mode=self.params.get("execution_mode", None),
+                    progress=progress,
+                )
+            self.df = batches_to_df(spec_batches)
         self.df["calc_mz"] = (
             (self.df["calc_mz"].astype(float) - self.PROTON)
             / self.df["charge"].astype(int)
@@ -1,12 +1,32 @@
 """Parser handler."""
+import pickle
+import threading
+from importlib.metadata import PackageNotFoundError, version
 
-import IsoSpecPy as iso
 import numpy as np
+import pandas as pd
 import regex as re
-from IsoSpecPy.PeriodicTbl import symbol_to_masses
-from chemical_composition import ChemicalComposition
 from loguru import logger
 
+from unify_idents.utils import (
+    file_fingerprint,
+    get_cache_dir,
+    hash_file_contents,
+    write_cache_file,
+)
+
+try:
+    UNIMOD_MAPPER_VERSION = version("unimod-mapper")
+except PackageNotFoundError:
+    UNIMOD_MAPPER_VERSION = ""
+
+_unimod_mappers = {}
+_peptide_mappers = {}
+_meta_info_lookups = {}
+_peptide_automatons = {}
+_resource_lock = threading.RLock()
+peptide_mapper_lock = threading.Lock()
+
 
 def trunc(values, decs=0):
     """Truncate  float to `number of decimals.
@@ -19,6 +39,130 @@ def trunc(values, decs=0):
     # return np.trunc(values * 10**decs) / (10**decs)
 
 
+def _build_unimod_mapper_index(mod_mapper):
+    """Parse all unimod xml files and build the lookups of a mapper.
+
+    Args:
+        mod_mapper (UnimodMapper): mapper with unparsed xml files
+    """
+    mod_mapper.data_list
+    mod_mapper.mapper
+    mod_mapper.df
+
+
+def get_unimod_mapper(xml_file_list=None):
+    """Return a process-wide UnimodMapper for the given xml files.
+
+    Mappers are keyed by the contents of all xml files. A pickled, pre-built
+    mapper is kept in the cache directory, if it is writable, so that later
+    runs and spawned workers load it instead of parsing the xml files again.
+
+    Args:
+        xml_file_list (list, optional): list of user unimod xml files
+
+    Returns:
+        mod_mapper (UnimodMapper): shared mapper, must not be modified
+    """
+    from unimod_mapper.unimod_mapper import UnimodMapper
+
+    mod_mapper = UnimodMapper(xml_file_list=xml_file_list)
+    key = hash_file_contents(mod_mapper.unimod_xml_names, salt=UNIMOD_MAPPER_VERSION)
+    with _resource_lock:
+        if key in _unimod_mappers:
+            return _unimod_mappers[key]
+
+        cache_file = None
+        try:
+            cache_file = get_cache_dir() / f"unimod_mapper_{key}.pkl"
+            with open(cache_file, "rb") as f:
+                mod_mapper = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            _build_unimod_mapper_index(mod_mapper)
+            if cache_file is not None:
+                write_cache_file(
+                    cache_file,
+                    lambda f: pickle.dump(
+                        mod_mapper, f, protocol=pickle.HIGHEST_PROTOCOL
+                    ),
+                )
+        _unimod_mappers[key] = mod_mapper
+
+    return mod_mapper
+
+
+def get_peptide_mapper(database):
+    """Return a process-wide peptide mapper for a fasta database.
+
+    Mappers are keyed by path, size and modification time of the database.
+    map_peptides changes the state of the mapper, calls have to hold
+    peptide_mapper_lock.
+
+    Args:
+        database (str): path to fasta database
+
+    Returns:
+        peptide_mapper (UPeptideMapper): shared mapper
+    """
+    from peptide_mapper.mapper import UPeptideMapper
+
+    key = file_fingerprint(database)
+    with _resource_lock:
+        if key not in _peptide_mappers:
+            _peptide_mappers[key] = UPeptideMapper(database)
+    return _peptide_mappers[key]
+
+
+def read_meta_info_lookup(file, rt_truncate_precision):
+    """Read a meta info lookup file once per file version and precision.
+
+    Args:
+        file (str): path to meta info lookup csv
+        rt_truncate_precision (int): decimals of the truncated retention time index
+
+    Returns:
+        rt_lookup (pd.DataFrame): shared lookup indexable by Spectrum ID, must not be modified
+    """
+    key = (*file_fingerprint(file), rt_truncate_precision)
+    with _resource_lock:
+        if key in _meta_info_lookups:
+            return _meta_info_lookups[key]
+        rt_lookup = pd.read_csv(file, compression="infer")
+        rt_lookup["rt_unit"] = rt_lookup["rt_unit"].replace(
+            {"second": 1, "minute": 60, "s": 1, "min": 60}
+        )
+        rt_lookup.set_index(
+            [
+                "spectrum_id",
+                rt_lookup["rt"].apply(trunc, args=(rt_truncate_precision,)),
+            ],
+            inplace=True,
+        )
+        _meta_info_lookups[key] = rt_lookup
+    return rt_lookup
+
+
+def get_peptide_automaton(peptides):
+    """Return a process-wide Aho-Corasick automaton over peptide sequences.
+
+    Args:
+        peptides (tuple): peptide sequences
+
+    Returns:
+        auto (ahocorasick.Automaton): shared automaton, must not be modified
+    """
+    import ahocorasick
+
+    peptides = tuple(peptides)
+    with _resource_lock:
+        if peptides not in _peptide_automatons:
+            auto = ahocorasick.Automaton()
+            for seq in peptides:
+                auto.add_word(seq, seq)
+            auto.make_automaton()
+            _peptide_automatons[peptides] = auto
+    return _peptide_automatons[peptides]
+
+
 def init_custom_cc(function, xml_file_list, proton):
     """Initialize function for multiprocessing by providing 'global' attribute.
 
@@ -27,11 +171,13 @@ def init_custom_cc(function, xml_file_list, proton):
         xml_file_list (list): list of xml files to be passed to ChemicalComposition
         proton (float): proton mass
     """
+    from chemical_composition import ChemicalComposition
 
     def _calc_mz(mass, charge):
         return (mass + (charge * proton)) / charge
 
     function.cc = ChemicalComposition(unimod_file_list=xml_file_list)
+    function.cc._unimod_parser = get_unimod_mapper(xml_file_list)
     function.calc_mz = _calc_mz
 
 
@@ -50,6 +196,9 @@ def get_composition_and_mass_and_accuracy(seq, mods, charge, exp_mz):
     Returns:
         tuple: hill_notation_unimod string, mass, accuracy
     """
+    import IsoSpecPy as iso
+    from IsoSpecPy.PeriodicTbl import symbol_to_masses
+
     composition = None
     c12_mass = None
     isotopologue_acc = None
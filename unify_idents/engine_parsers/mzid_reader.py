@@ -0,0 +1,343 @@
+"""Streaming mzIdentML reader."""
+from functools import partial
+
+import pandas as pd
+from lxml import etree
+from tqdm import tqdm
+
+from unify_idents.engine_parsers.psm_batch import batches_to_df, rows_to_batch
+from unify_idents.engine_parsers.xml_index import get_xml_index, parse_slices
+from unify_idents.utils import open_input
+
+RESULT_BATCH_SIZE = 1000
+
+# Elements which are cleared once read, so the partial tree does not grow
+_SEQUENCE_COLLECTION_TAGS = ["{*}DBSequence", "{*}Peptide", "{*}PeptideEvidence"]
+
+
+def _release(element):
+    """Clear an element and drop its already processed siblings.
+
+    Args:
+        element (lxml.etree._Element): processed element
+    """
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def extract_result_rows(
+    result, spectrum_params=False, user_params=False, max_rank=None
+):
+    """Collect the PSMs of one SpectrumIdentificationResult.
+
+    Later sources override earlier ones: cvParams of the whole result (if
+    spectrum_params), attributes, cvParams and userParams (if user_params) of
+    the SpectrumIdentificationItem.
+
+    Args:
+        result (lxml.etree._Element): SpectrumIdentificationResult element
+        spectrum_params (bool, optional): include cvParams of the whole result
+        user_params (bool, optional): include userParams of each item
+        max_rank (int, optional): skip items with a higher engine rank
+
+    Returns:
+        list: one dict of engine level values per PSM, including "spectrumID"
+    """
+    spec_level = {"spectrumID": result.attrib.get("spectrumID")}
+    if spectrum_params is True:
+        spec_level.update(
+            {c.attrib["name"]: c.attrib.get("value") for c in result.iter("{*}cvParam")}
+        )
+    rows = []
+    for psm in result.iter("{*}SpectrumIdentificationItem"):
+        if max_rank is not None and int(psm.attrib.get("rank", 1)) > max_rank:
+            continue
+        row = spec_level.copy()
+        row.update(psm.attrib)
+        row.update(
+            {c.attrib["name"]: c.attrib.get("value") for c in psm.iter("{*}cvParam")}
+        )
+        if user_params is True:
+            row.update(
+                {
+                    c.attrib["name"]: c.attrib.get("value")
+                    for c in psm.iter("{*}userParam")
+                }
+            )
+        rows.append(row)
+    return rows
+
+
+def _result_columns(keys):
+    """Return the batch columns for engine level keys.
+
+    Args:
+        keys (iterable): engine level keys
+
+    Returns:
+        list: keys with "spectrumID" first
+    """
+    return ["spectrumID"] + [k for k in keys if k != "spectrumID"]
+
+
+def read_indexed_results(
+    input_file,
+    namespaces,
+    encoding,
+    columns,
+    spectrum_params,
+    user_params,
+    max_rank,
+    offsets,
+):
+    """Read a batch of SpectrumIdentificationResults directly from the file.
+
+    Args:
+        input_file (str): path to mzIdentML file
+        namespaces (str): namespace declarations of the root element
+        encoding (str): encoding of the file
+        columns (list): engine level keys to keep
+        spectrum_params (bool): include cvParams of the whole result
+        user_params (bool): include userParams of each item
+        max_rank (int): skip items with a higher engine rank, None keeps all
+        offsets (list): byte ranges of the results, see xml_index
+
+    Returns:
+        dict: PSM batch of engine level columns
+    """
+    rows = []
+    for result in parse_slices(input_file, offsets, namespaces, encoding):
+        rows.extend(
+            extract_result_rows(
+                result,
+                spectrum_params=spectrum_params,
+                user_params=user_params,
+                max_rank=max_rank,
+            )
+        )
+    return rows_to_batch(rows, columns)
+
+
+def results_to_df(batches, reference_dict, mapping_dict, spectrum_id_from_ref=False):
+    """Build a unified dataframe from columnar result batches.
+
+    Args:
+        batches (iterable): PSM batches of engine level columns
+        reference_dict (dict): unified columns and their default values
+        mapping_dict (dict): engine level key to unified column name
+        spectrum_id_from_ref (bool, optional): derive spectrum_id from the
+            "scan=" part of spectrumID before engine values are mapped
+
+    Returns:
+        df (pd.DataFrame): one row per PSM
+    """
+    raw = batches_to_df(batches, columns=["spectrumID", *mapping_dict])
+    df = pd.DataFrame(
+        {k: [v] * len(raw) for k, v in reference_dict.items()},
+        index=raw.index,
+        dtype=object,
+    )
+    if spectrum_id_from_ref is True:
+        df["spectrum_id"] = raw["spectrumID"].str.split("scan=").str[-1]
+    for key, column in mapping_dict.items():
+        if key not in raw.columns:
+            continue
+        values = raw[key].astype(object)
+        if column in df.columns:
+            df[column] = values.where(values.notna(), df[column])
+        else:
+            df[column] = values
+    return df
+
+
+class MzidReader:
+    """Read mzIdentML files in two streaming passes.
+
+    The first pass stops at AnalysisData and collects the software version and
+    the Peptide, Modification and SearchModification tables. The second pass
+    streams SpectrumIdentificationResults as columnar batches. Processed
+    elements are cleared in both passes.
+
+    Attributes:
+        software_version (str): version of the first AnalysisSoftware
+        peptides (dict): peptide id to dict with "sequence" and "modifications",
+            a list of Modification attributes with their "cv_params"
+        search_modifications (list): SearchModification attributes with their
+            "cv_params"
+    """
+
+    def __init__(self, input_file):
+        """Initialize reader and read the tables.
+
+        Args:
+            input_file (str): path to mzIdentML file
+        """
+        self.input_file = input_file
+        self.software_version = None
+        self.peptides = {}
+        self.search_modifications = []
+        self.read_tables()
+
+    def read_tables(self):
+        """Collect software version, peptides and search modifications."""
+        self.peptides = {}
+        self.search_modifications = []
+        with open_input(self.input_file) as f:
+            context = etree.iterparse(
+                f,
+                events=("start", "end"),
+                tag=[
+                    "{*}AnalysisSoftware",
+                    "{*}SearchModification",
+                    "{*}AnalysisData",
+                    *_SEQUENCE_COLLECTION_TAGS,
+                ],
+            )
+            for event, element in context:
+                tag = etree.QName(element).localname
+                if tag == "AnalysisData":
+                    break
+                if event == "start":
+                    continue
+                if tag == "AnalysisSoftware" and self.software_version is None:
+                    self.software_version = element.attrib.get("version")
+                elif tag == "Peptide":
+                    self.peptides[element.attrib.get("id", "")] = self._read_peptide(
+                        element
+                    )
+                elif tag == "SearchModification":
+                    self.search_modifications.append(
+                        {
+                            **element.attrib,
+                            "cv_params": [
+                                dict(c.attrib) for c in element.iter("{*}cvParam")
+                            ],
+                        }
+                    )
+                if tag in ("DBSequence", "Peptide", "PeptideEvidence"):
+                    _release(element)
+
+    @staticmethod
+    def _read_peptide(peptide):
+        """Read sequence and modifications of a Peptide element.
+
+        Args:
+            peptide (lxml.etree._Element): Peptide element
+
+        Returns:
+            dict: sequence and modifications
+        """
+        sequence = None
+        for child in peptide.iter("{*}PeptideSequence"):
+            sequence = child.text
+        return {
+            "sequence": sequence,
+            "modifications": [
+                {
+                    **mod.attrib,
+                    "cv_params": [dict(c.attrib) for c in mod.iter("{*}cvParam")],
+                }
+                for mod in peptide.iter("{*}Modification")
+            ],
+        }
+
+    def iter_result_batches(
+        self,
+        keys,
+        batch_size=RESULT_BATCH_SIZE,
+        spectrum_params=False,
+        user_params=False,
+        max_rank=None,
+    ):
+        """Stream SpectrumIdentificationResults as columnar batches.
+
+        Args:
+            keys (iterable): engine level keys to keep, "spectrumID" is always kept
+            batch_size (int, optional): spectra per batch
+            spectrum_params (bool, optional): include cvParams of the whole result
+            user_params (bool, optional): include userParams of each item
+            max_rank (int, optional): skip items with a higher engine rank
+
+        Yields:
+            dict: key to list of values, one entry per PSM
+        """
+        columns = _result_columns(keys)
+        rows = []
+        n_spectra = 0
+        with open_input(self.input_file) as f:
+            context = etree.iterparse(
+                f,
+                events=("end",),
+                tag=[
+                    "{*}SpectrumIdentificationResult",
+                    "{*}ProteinAmbiguityGroup",
+                    *_SEQUENCE_COLLECTION_TAGS,
+                ],
+            )
+            for _, element in context:
+                if etree.QName(element).localname == "SpectrumIdentificationResult":
+                    rows.extend(
+                        extract_result_rows(
+                            element,
+                            spectrum_params=spectrum_params,
+                            user_params=user_params,
+                            max_rank=max_rank,
+                        )
+                    )
+                    n_spectra += 1
+                _release(element)
+                if n_spectra >= batch_size:
+                    yield rows_to_batch(rows, columns)
+                    rows = []
+                    n_spectra = 0
+        if n_spectra > 0:
+            yield rows_to_batch(rows, columns)
+
+    def map_indexed_batches(
+        self,
+        executor,
+        keys,
+        batch_size=None,
+        spectrum_params=False,
+        user_params=False,
+        max_rank=None,
+        mode=None,
+    ):
+        """Read SpectrumIdentificationResults in workers via a byte offset index.
+
+        Only offsets are sent to the workers, which parse their slices of the
+        memory mapped file.
+
+        Args:
+            executor (UnifyExecutor): executor running the batches
+            keys (iterable): engine level keys to keep, "spectrumID" is always kept
+            batch_size (int, optional): spectra per batch, auto sized if None
+            spectrum_params (bool, optional): include cvParams of the whole result
+            user_params (bool, optional): include userParams of each item
+            max_rank (int, optional): skip items with a higher engine rank
+            mode (str, optional): execution mode
+
+        Returns:
+            list: PSM batches of engine level columns
+        """
+        index = get_xml_index(self.input_file, "SpectrumIdentificationResult")
+        with tqdm(total=len(index["offsets"]), unit="spectrum") as progress:
+            return executor.map_batches(
+                partial(
+                    read_indexed_results,
+                    str(self.input_file),
+                    index["namespaces"],
+                    index["encoding"],
+                    _result_columns(keys),
+                    spectrum_params,
+                    user_params,
+                    max_rank,
+                ),
+                index["offsets"],
+                batch_size=batch_size,
+                mode=mode,
+                progress=progress,
+            )
@@ -0,0 +1,78 @@
+"""Columnar PSM batches exchanged between workers and the main process.
+
+A batch is a dict of column name to list of values, all lists having the same
+length. Batches are cheap to pickle and are appended column by column, so no
+dataframe is built per spectrum.
+"""
+import pandas as pd
+
+
+def rows_to_batch(rows, columns=None):
+    """Convert PSM rows to a batch.
+
+    Args:
+        rows (list): dicts of PSM values
+        columns (iterable, optional): columns of the batch, defaults to all
+            keys of all rows in order of appearance
+
+    Returns:
+        dict: column to list of values, None where a row lacks the column
+    """
+    if columns is None:
+        columns = dict.fromkeys(k for row in rows for k in row)
+    return {c: [row.get(c) for row in rows] for c in columns}
+
+
+def batch_length(batch):
+    """Return the number of PSMs in a batch.
+
+    Args:
+        batch (dict): PSM batch
+
+    Returns:
+        int: number of PSMs
+    """
+    return len(next(iter(batch.values()), ()))
+
+
+def concat_batches(batches):
+    """Append batches column by column.
+
+    Columns missing in a batch are filled with None.
+
+    Args:
+        batches (iterable): PSM batches, None entries are skipped
+
+    Returns:
+        dict: PSM batch holding all PSMs
+    """
+    columns = {}
+    n_rows = 0
+    for batch in batches:
+        if batch is None:
+            continue
+        n_batch = batch_length(batch)
+        for column in columns.keys() - batch.keys():
+            columns[column].extend([None] * n_batch)
+        for column, values in batch.items():
+            if column not in columns:
+                columns[column] = [None] * n_rows
+            columns[column].extend(values)
+        n_rows += n_batch
+    return columns
+
+
+def batches_to_df(batches, columns=None):
+    """Build a dataframe from PSM batches.
+
+    Args:
+        batches (iterable): PSM batches, None entries are skipped
+        columns (iterable, optional): columns of an empty result
+
+    Returns:
+        df (pd.DataFrame): one row per PSM
+    """
+    batch = concat_batches(batches)
+    if len(batch) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(batch)
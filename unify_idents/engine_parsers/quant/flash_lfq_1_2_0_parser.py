@@ -17,27 +17,24 @@ class FlashLFQ_1_2_0_Parser(QuantBaseParser):
         """
         super().__init__(*args, **kwargs)
         self.style = "flash_lfq_style_1"
-        self.mapping_dict = {
-            v: k
-            for k, v in self.param_mapper.get_default_params(style=self.style)[
-                "header_translations"
-            ]["translated_value"].items()
-        }
+        self.mapping_dict = self._get_mapping_dict()
         self.df = pd.read_csv(self.input_file, delimiter="\t")
         self.df.rename(columns=self.mapping_dict, inplace=True)
 
     @classmethod
-    def check_parser_compatibility(cls, file):
+    def check_parser_compatibility(cls, file, header=None):
         """Assert compatibility between file and parser.
 
         Args:
             file (str): path to input file
+            header (FileHeader, optional): shared file header
 
         Returns:
             bool: True if parser and file are compatible
 
         """
-        is_tsv = file.as_posix().endswith(".tsv")
+        header = cls._get_file_header(file, header)
+        is_tsv = header.format == "tsv"
         flash_lfq_columns = {
             "File Name",
             "Base Sequence",
@@ -62,8 +59,7 @@ class FlashLFQ_1_2_0_Parser(QuantBaseParser):
             "Peak Split Valley RT",
             "Peak Apex Mass Error (ppm)",
         }
-        with open(file.as_posix()) as f:
-            head = set(f.readline().replace("\n", "").split("\t"))
+        head = set(header.lines(1).replace("\n", "").split("\t"))
         headers_match = len(flash_lfq_columns.difference(head)) == 0
         return is_tsv and headers_match
 
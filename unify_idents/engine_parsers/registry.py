@@ -0,0 +1,213 @@
+"""Parser registry."""
+from importlib import import_module
+
+from unify_idents.utils import input_suffix
+
+ENTRY_POINT_GROUP = "unify_idents.parsers"
+
+# name: (import target, file suffixes, content markers)
+BUILTIN_PARSERS = {
+    "comet_2020_01_4": (
+        "unify_idents.engine_parsers.ident.comet_2020_01_4_parser:Comet_2020_01_4_Parser",
+        (".mzid",),
+        ("<MzIdentML", "Comet"),
+    ),
+    "dummy": ("unify_idents.engine_parsers.ident.dummy_parser:Dummy", (), ()),
+    "mascot_2_6_2": (
+        "unify_idents.engine_parsers.ident.mascot_2_6_2_parser:Mascot_2_6_2_Parser",
+        (".dat",),
+        ("application/x-Mascot",),
+    ),
+    "msamanda_2": (
+        "unify_idents.engine_parsers.ident.msamanda_2_parser:MSAmanda_2_Parser",
+        (".csv",),
+        ("#version: 2.",),
+    ),
+    "msfragger_3": (
+        "unify_idents.engine_parsers.ident.msfragger_3_parser:MSFragger_3_Parser",
+        (".tsv",),
+        ("scannum", "hyperscore"),
+    ),
+    "msgfplus_2021_03_22": (
+        "unify_idents.engine_parsers.ident.msgfplus_2021_03_22_parser:MSGFPlus_2021_03_22_Parser",
+        (".mzid",),
+        ("<MzIdentML", "MS-GF+"),
+    ),
+    "omssa_2_1_9": (
+        "unify_idents.engine_parsers.ident.omssa_2_1_9_parser:Omssa_Parser",
+        (".csv",),
+        ("Spectrum number", "E-value"),
+    ),
+    "xtandem_alanine": (
+        "unify_idents.engine_parsers.ident.xtandem_alanine:XTandemAlanine_Parser",
+        (".xml",),
+        ("tandem-style.xsl",),
+    ),
+    "flash_lfq_1_2_0": (
+        "unify_idents.engine_parsers.quant.flash_lfq_1_2_0_parser:FlashLFQ_1_2_0_Parser",
+        (".tsv",),
+        ("Base Sequence", "Peak RT Apex"),
+    ),
+}
+
+_registry = None
+
+
+class ParserEntry:
+    """Registered parser which is only imported on first use.
+
+    Attributes:
+        name (str): registry name of the parser
+        target (str): import target in the form "package.module:ClassName"
+        suffixes (tuple): file suffixes the parser can handle, None if unknown
+        markers (tuple): strings which all occur in the header of compatible files,
+            None if unknown
+    """
+
+    def __init__(self, name, target, suffixes=None, markers=None):
+        """Initialize entry.
+
+        Args:
+            name (str): registry name of the parser
+            target (str): import target in the form "package.module:ClassName"
+            suffixes (iterable, optional): file suffixes the parser can handle
+            markers (iterable, optional): strings which all occur in the header
+                of compatible files
+        """
+        self.name = name
+        self.target = target
+        self.suffixes = tuple(suffixes) if suffixes is not None else None
+        self.markers = tuple(markers) if markers is not None else None
+        self._parser = None
+
+    def __repr__(self):
+        """Represent entry by name and target."""
+        return f"ParserEntry({self.name!r}, {self.target!r})"
+
+    def matches_suffix(self, file):
+        """Check whether the file suffix is handled by the parser.
+
+        Compression suffixes such as .gz are ignored.
+
+        Args:
+            file (Path): path to input file
+
+        Returns:
+            bool: True if suffix is handled or unknown
+        """
+        if self.suffixes is None:
+            return True
+        return input_suffix(file) in self.suffixes
+
+    def matches_header(self, header):
+        """Check whether the file header contains all markers of the parser.
+
+        Args:
+            header (FileHeader): sniffed file header
+
+        Returns:
+            bool: True if all markers are found or markers are unknown
+        """
+        if self.markers is None:
+            return True
+        return len(self.markers) > 0 and all(m in header.text for m in self.markers)
+
+    def load(self):
+        """Import and return the parser class.
+
+        Returns:
+            parser (type): parser class
+        """
+        if self._parser is None:
+            module_name, class_name = self.target.split(":")
+            self._parser = getattr(import_module(module_name), class_name)
+        return self._parser
+
+
+def _iter_entry_points():
+    """Yield third-party parser entry points.
+
+    Yields:
+        EntryPoint: entry point registered in ENTRY_POINT_GROUP
+    """
+    from importlib.metadata import entry_points
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        yield from eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        yield from eps.get(ENTRY_POINT_GROUP, [])
+
+
+def _discover():
+    """Collect builtin and entry point parsers.
+
+    Returns:
+        registry (dict): parser name to ParserEntry
+    """
+    registry = {
+        name: ParserEntry(name, target, suffixes, markers)
+        for name, (target, suffixes, markers) in BUILTIN_PARSERS.items()
+    }
+    for ep in _iter_entry_points():
+        if ep.name in registry:
+            from loguru import logger
+
+            logger.warning(f"Parser entry point {ep.name} shadows a registered parser.")
+        registry[ep.name] = ParserEntry(ep.name, ep.value)
+    return registry
+
+
+def get_parser_registry():
+    """Return the process-wide parser registry, discovering it on first call.
+
+    Returns:
+        registry (dict): parser name to ParserEntry
+    """
+    global _registry
+    if _registry is None:
+        _registry = _discover()
+    return _registry
+
+
+def register_parser(name, target, suffixes=None, markers=None):
+    """Register a parser at runtime.
+
+    Args:
+        name (str): registry name of the parser
+        target (str or type): import target "package.module:ClassName" or parser class
+        suffixes (iterable, optional): file suffixes the parser can handle
+        markers (iterable, optional): strings which all occur in the header of
+            compatible files
+
+    Returns:
+        entry (ParserEntry): registered entry
+    """
+    if isinstance(target, type):
+        entry = ParserEntry(
+            name, f"{target.__module__}:{target.__name__}", suffixes, markers
+        )
+        entry._parser = target
+    else:
+        entry = ParserEntry(name, target, suffixes, markers)
+    get_parser_registry()[name] = entry
+    return entry
+
+
+def get_parser_candidates(file, header=None):
+    """Return registered parsers which might handle the file.
+
+    If a header is given, candidates are selected by content and the suffix is
+    ignored. Parsers are not imported.
+
+    Args:
+        file (Path): path to input file
+        header (FileHeader, optional): sniffed file header
+
+    Returns:
+        list: ParserEntry objects in dispatch order
+    """
+    entries = get_parser_registry().values()
+    if header is None:
+        return [e for e in entries if e.matches_suffix(file)]
+    return [e for e in entries if e.matches_header(header)]
@@ -0,0 +1,98 @@
+"""Schema driven reading of large engine result tables."""
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Rows parsed at once by the chunked C engine
+CHUNK_SIZE = 500000
+
+
+def _concat_chunks(chunks):
+    """Concatenate chunks, keeping categorical columns categorical.
+
+    Args:
+        chunks (list): dataframes with identical columns
+
+    Returns:
+        pd.DataFrame: concatenated dataframe
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    categoricals = {
+        column: union_categoricals([chunk[column] for chunk in chunks])
+        for column, dtype in chunks[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+    }
+    df = pd.concat(chunks, ignore_index=True)
+    for column, values in categoricals.items():
+        df[column] = values
+    return df
+
+
+def read_table(
+    file,
+    delimiter=",",
+    columns=None,
+    dtypes=None,
+    engine=None,
+    chunk_size=None,
+    row_filter=None,
+    **kwargs,
+):
+    """Read the selected columns of a delimited file with explicit dtypes.
+
+    The C engine reads the file in chunks, so row_filter drops rows before
+    they are collected. The kept chunks are concatenated at the end, which
+    needs about twice the memory of the result. The pyarrow engine reads the
+    file at once in parallel.
+
+    Args:
+        file (str): path to input file, may be compressed
+        delimiter (str, optional): column delimiter
+        columns (iterable, optional): columns to read if present, defaults to all
+        dtypes (dict, optional): column to dtype, columns without a dtype are
+            inferred
+        engine (str, optional): pandas parser engine, "c" or "pyarrow"
+        chunk_size (int, optional): rows per chunk for the C engine
+        row_filter (callable, optional): maps a chunk to a boolean mask of the
+            rows to keep, applied before chunks are concatenated
+        **kwargs: passed on to pd.read_csv
+
+    Returns:
+        pd.DataFrame: table with columns in file order
+    """
+    header = pd.read_csv(file, delimiter=delimiter, nrows=0, **kwargs).columns
+    if columns is not None:
+        columns = set(columns)
+        header = [column for column in header if column in columns]
+    dtype = {
+        column: dtype
+        for column, dtype in (dtypes or {}).items()
+        if column in set(header)
+    }
+    if engine == "pyarrow":
+        df = pd.read_csv(
+            file,
+            delimiter=delimiter,
+            usecols=header,
+            dtype=dtype,
+            engine=engine,
+            **kwargs,
+        )
+        if row_filter is not None:
+            df = df.loc[row_filter(df), :].reset_index(drop=True)
+        return df
+    chunks = pd.read_csv(
+        file,
+        delimiter=delimiter,
+        usecols=header,
+        dtype=dtype,
+        engine=engine or "c",
+        chunksize=chunk_size or CHUNK_SIZE,
+        **kwargs,
+    )
+    if row_filter is not None:
+        chunks = (chunk.loc[row_filter(chunk), :] for chunk in chunks)
+    chunks = list(chunks)
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=header).astype(dtype)
+    return _concat_chunks(chunks)[list(header)]
@@ -0,0 +1,239 @@
+"""Byte offset index of repeated elements in XML files.
+
+Workers read and parse the slices of their batch directly from a memory
+mapped file, so spectra do not pass through the main process.
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import regex as re
+from lxml import etree
+
+from unify_idents.utils import (
+    file_fingerprint,
+    get_cache_dir,
+    get_compression,
+    write_cache_file,
+)
+
+XML_INDEX_VERSION = 1
+XML_INDEX_SUFFIX = ".unify_index.json"
+# Memory maps kept open per process
+MAX_MAPPED_FILES = 8
+
+_declaration_pattern = re.compile(rb"""<\?xml[^>]*?encoding\s*=\s*["']([\w.-]+)""")
+_root_tag_pattern = re.compile(rb"<([A-Za-z_][\w.:-]*)([^>]*)>")
+_namespace_pattern = re.compile(rb"""\sxmlns(?::[\w.-]+)?\s*=\s*(["']).*?\1""")
+
+_mapped_files = OrderedDict()
+_mapped_files_lock = threading.Lock()
+
+
+def _element_pattern(tag):
+    """Match start, end and empty tags of an element with any prefix.
+
+    Args:
+        tag (str): local name of the element
+
+    Returns:
+        regex.Pattern: pattern with groups "end" and "attributes"
+    """
+    return re.compile(
+        rb"<(?P<end>/?)(?:[\w.-]+:)?"
+        + re.escape(tag).encode()
+        + rb"(?P<attributes>(?:\s[^>]*|/)?)>"
+    )
+
+
+def _root_namespaces(data):
+    """Collect the namespace declarations of the root element.
+
+    Args:
+        data (bytes-like): xml file contents
+
+    Returns:
+        str: declarations, e.g. 'xmlns="..." xmlns:GAML="..."'
+    """
+    for match in _root_tag_pattern.finditer(data):
+        declarations = _namespace_pattern.finditer(match.group(2))
+        return " ".join(m.group().strip().decode() for m in declarations)
+    return ""
+
+
+def build_xml_index(file, tag, attribute=None):
+    """Find the byte offsets of all outermost elements with a given tag.
+
+    Args:
+        file (str): path to xml file
+        tag (str): local name of the indexed elements
+        attribute (str, optional): only index elements with this attribute
+
+    Returns:
+        dict: "offsets", a list of [start, end) byte ranges, "namespaces" and
+            "encoding", needed to parse the slices
+    """
+    if get_compression(file) is not None:
+        raise ValueError(f"Compressed file {file} cannot be indexed.")
+    index = {"encoding": "UTF-8", "namespaces": "", "offsets": []}
+    with open(file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return index
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            declaration = _declaration_pattern.match(data)
+            if declaration is not None:
+                index["encoding"] = declaration.group(1).decode()
+            index["namespaces"] = _root_namespaces(data)
+            if attribute is not None:
+                attribute = re.compile(
+                    rb"\s" + re.escape(attribute).encode() + rb"\s*="
+                )
+            depth = 0
+            start = None
+            for match in _element_pattern(tag).finditer(data):
+                if match.group("end") == b"/":
+                    depth -= 1
+                    if depth == 0 and start is not None:
+                        index["offsets"].append([start, match.end()])
+                    continue
+                attributes = match.group("attributes")
+                if depth == 0:
+                    keep = attribute is None or attribute.search(attributes)
+                    start = match.start() if keep else None
+                    if attributes.endswith(b"/"):
+                        if start is not None:
+                            index["offsets"].append([start, match.end()])
+                        continue
+                if not attributes.endswith(b"/"):
+                    depth += 1
+    return index
+
+
+def _index_files(file, tag, attribute):
+    """Yield the index location next to the input and its fallback in the cache.
+
+    The cache directory is only looked up when the fallback is needed and
+    skipped if it is not available.
+
+    Args:
+        file (str): path to xml file
+        tag (str): local name of the indexed elements
+        attribute (str): attribute filter or None
+
+    Yields:
+        Path: candidate index files
+    """
+    file = Path(file).resolve()
+    name = f"{file.name}.{tag}{'' if attribute is None else '.' + attribute}"
+    yield file.parent / f".{name}{XML_INDEX_SUFFIX}"
+    try:
+        cache_dir = get_cache_dir()
+    except OSError:
+        return
+    key = hashlib.sha1(str(file).encode()).hexdigest()[:16]
+    yield cache_dir / f"xml_index_{key}_{name}{XML_INDEX_SUFFIX}"
+
+
+def get_xml_index(file, tag, attribute=None):
+    """Load the cached index of a file or build and cache it.
+
+    Indices are stored next to the input, or in the cache directory if the
+    input directory is not writable. They are rebuilt when size or
+    modification time of the input changed.
+
+    Args:
+        file (str): path to xml file
+        tag (str): local name of the indexed elements
+        attribute (str, optional): only index elements with this attribute
+
+    Returns:
+        dict: index, see build_xml_index
+    """
+    _, size, mtime_ns = file_fingerprint(file)
+    meta = {
+        "version": XML_INDEX_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "tag": tag,
+        "attribute": attribute,
+    }
+    for index_file in _index_files(file, tag, attribute):
+        try:
+            with open(index_file) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if index.get("meta") == meta:
+            return index
+
+    index = build_xml_index(file, tag, attribute=attribute)
+    index["meta"] = meta
+    for index_file in _index_files(file, tag, attribute):
+        if write_cache_file(index_file, lambda f: json.dump(index, f), mode="w"):
+            break
+    return index
+
+
+def _get_mapped_file(file):
+    """Return a read-only memory map of a file, kept open for later batches.
+
+    Evicted maps are not closed explicitly, threads may still be slicing
+    them. They are closed once the last reference is gone.
+
+    Args:
+        file (str): path to file
+
+    Returns:
+        mmap.mmap: memory map
+    """
+    key = file_fingerprint(file)
+    with _mapped_files_lock:
+        if key not in _mapped_files:
+            with open(file, "rb") as f:
+                _mapped_files[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            while len(_mapped_files) > MAX_MAPPED_FILES:
+                _mapped_files.popitem(last=False)
+        _mapped_files.move_to_end(key)
+        return _mapped_files[key]
+
+
+def read_slices(file, offsets):
+    """Read byte ranges of a file via a memory map.
+
+    Args:
+        file (str): path to file
+        offsets (list): [start, end) byte ranges
+
+    Returns:
+        list: bytes of each range
+    """
+    data = _get_mapped_file(file)
+    return [data[start:end] for start, end in offsets]
+
+
+def parse_slices(file, offsets, namespaces="", encoding="UTF-8"):
+    """Parse indexed elements of a file.
+
+    Args:
+        file (str): path to xml file
+        offsets (list): [start, end) byte ranges of elements
+        namespaces (str, optional): namespace declarations of the root element
+        encoding (str, optional): encoding of the file
+
+    Returns:
+        list: parsed elements
+    """
+    if len(offsets) == 0:
+        return []
+    wrapper = etree.fromstring(
+        f'<?xml version="1.0" encoding="{encoding}"?><slices {namespaces}>'.encode(
+            encoding
+        )
+        + b"".join(read_slices(file, offsets))
+        + b"</slices>"
+    )
+    return list(wrapper)
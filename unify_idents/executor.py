@@ -0,0 +1,732 @@
+"""Long-lived worker pool shared by all parallel stages."""
+import atexit
+import hashlib
+import math
+import multiprocessing as mp
+import os
+import pickle
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from importlib import import_module
+from itertools import chain
+from pathlib import Path
+
+# Modules imported once in every worker when it starts
+PRELOAD_MODULES = (
+    "pandas",
+    "lxml.etree",
+    "chemical_composition",
+    "unify_idents.engine_parsers.misc",
+)
+
+EXECUTION_MODES = ("auto", "inline", "thread", "process")
+
+# Relative cost per item of the parallel stages
+SPECTRUM_COST = 1.0
+PSM_COMPOSITION_COST = 4.0
+
+# Workloads below these costs run inline or in threads when mode is "auto",
+# since pool startup and pickling dominate for small inputs
+INLINE_MAX_COST = 5000
+THREAD_MAX_COST = 20000
+
+# Bounds of automatically sized batches, each worker gets about
+# TASKS_PER_WORKER batches so uneven batches still balance out
+MIN_BATCH_SIZE = 16
+MAX_BATCH_SIZE = 4096
+TASKS_PER_WORKER = 4
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+_executors = {}
+_executors_lock = threading.Lock()
+# Process-wide slots for tasks running in any pool, see get_concurrency_limit
+_slots = None
+_concurrency_limit = None
+
+# Key of the initializer state held by this process or worker
+_worker_state_key = None
+# Inline and thread runs in this process share the module level state of the
+# initializers, runs with different state wait for each other
+_local_state_condition = threading.Condition()
+_local_state_users = 0
+
+
+def _cgroup_cpu_limit(root=CGROUP_ROOT):
+    """Read the CPU quota of the current cgroup.
+
+    Args:
+        root (Path, optional): cgroup mount point
+
+    Returns:
+        int: number of CPUs granted by the quota, None if unlimited or unknown
+    """
+    try:
+        # cgroup v2
+        quota, period = (root / "cpu.max").read_text().split()[:2]
+        if quota == "max":
+            return None
+        quota, period = int(quota), int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            for cpu_dir in [root / "cpu", root / "cpu,cpuacct", root]:
+                if (cpu_dir / "cpu.cfs_quota_us").exists():
+                    break
+            quota = int((cpu_dir / "cpu.cfs_quota_us").read_text())
+            period = int((cpu_dir / "cpu.cfs_period_us").read_text())
+        except (OSError, ValueError):
+            return None
+    if quota <= 0 or period <= 0:
+        return None
+    return max(1, math.ceil(quota / period))
+
+
+@lru_cache(maxsize=1)
+def available_cpus():
+    """Return the number of CPUs this process may use.
+
+    Respects the affinity mask and cgroup CPU quotas, so containers do not
+    size pools by the core count of the host.
+
+    Returns:
+        int: number of usable CPUs
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return max(1, cpus)
+
+
+def default_worker_count():
+    """Return the default number of workers, keeping one CPU for the main process.
+
+    Returns:
+        int: number of workers
+    """
+    return max(1, available_cpus() - 1)
+
+
+def get_concurrency_limit():
+    """Return the maximum number of tasks running at once in all pools.
+
+    The limit is shared by every pool of the library, so concurrent or nested
+    runs do not oversubscribe the CPUs. Defaults to the environment variable
+    UNIFY_IDENTS_MAX_CONCURRENCY or available_cpus().
+
+    Returns:
+        int: concurrency limit
+    """
+    if _concurrency_limit is None:
+        set_concurrency_limit(
+            int(os.environ.get("UNIFY_IDENTS_MAX_CONCURRENCY", available_cpus()))
+        )
+    return _concurrency_limit
+
+
+def set_concurrency_limit(limit):
+    """Set the maximum number of tasks running at once in all pools.
+
+    Tasks which already hold a slot keep it until they finish.
+
+    Args:
+        limit (int): concurrency limit
+    """
+    global _slots, _concurrency_limit
+    limit = max(1, int(limit))
+    _slots = threading.Semaphore(limit)
+    _concurrency_limit = limit
+
+
+def auto_batch_size(n_items, n_workers):
+    """Size batches so every worker gets a few contiguous blocks of items.
+
+    Args:
+        n_items (int): number of items
+        n_workers (int): number of workers
+
+    Returns:
+        int: items per batch, between MIN_BATCH_SIZE and MAX_BATCH_SIZE
+    """
+    batch_size = math.ceil(n_items / (max(1, n_workers) * TASKS_PER_WORKER))
+    return min(MAX_BATCH_SIZE, max(MIN_BATCH_SIZE, batch_size))
+
+
+def _warm_worker(modules):
+    """Import modules in a fresh worker.
+
+    Args:
+        modules (iterable): module names
+    """
+    for module in modules:
+        import_module(module)
+
+
+class _MissingState:
+    """Result of a chunk sent without its state to a worker lacking it."""
+
+
+def _run_chunk(func, items, call):
+    """Apply func to a chunk of items.
+
+    Args:
+        func (callable): function applied to the items
+        items (list): items of the chunk
+        call (str): "item" calls func per item, "star" per item with the item
+            unpacked as positional arguments, "batch" once with all items
+
+    Returns:
+        list: results in item order, the result of func for "batch"
+    """
+    if call == "batch":
+        return func(items)
+    if call == "star":
+        return [func(*item) for item in items]
+    return [func(item) for item in items]
+
+
+def _run_pool_chunk(state, func, items, call):
+    """Apply func to a chunk of items in a worker, initializing its state if needed.
+
+    Args:
+        state (tuple): state key and a tuple of initializer and initargs, the
+            latter None if the worker is expected to hold the state already
+        func (callable): function applied to the items
+        items (list): items of the chunk
+        call (str): how func is applied, see _run_chunk
+
+    Returns:
+        tuple: pid of the worker and the result of _run_chunk, a _MissingState
+            if the state was not sent and the worker does not hold it
+    """
+    global _worker_state_key
+    key, payload = state
+    if key is not None and key != _worker_state_key:
+        if payload is None:
+            return os.getpid(), _MissingState()
+        initializer, initargs = payload
+        initializer(*initargs)
+        _worker_state_key = key
+    return os.getpid(), _run_chunk(func, items, call)
+
+
+def _record_sizes(chunks, sizes):
+    """Pass chunks on, appending their lengths to sizes.
+
+    Args:
+        chunks (iterable): lists of items
+        sizes (deque): receives the length of every chunk
+
+    Yields:
+        list: chunks
+    """
+    for chunk in chunks:
+        sizes.append(len(chunk))
+        yield chunk
+
+
+@contextmanager
+def _local_state(key, initializer, initargs):
+    """Hold the module level state of an initializer in this process.
+
+    Runs needing the same state proceed concurrently, a run needing another
+    state waits until all current users are done.
+
+    Args:
+        key (str): state key
+        initializer (callable): state initializer or None if no state is needed
+        initargs (tuple): arguments of initializer
+    """
+    global _worker_state_key, _local_state_users
+    if initializer is None:
+        yield
+        return
+    with _local_state_condition:
+        while _local_state_users > 0 and key != _worker_state_key:
+            _local_state_condition.wait()
+        if key != _worker_state_key:
+            initializer(*initargs)
+            _worker_state_key = key
+        _local_state_users += 1
+    try:
+        yield
+    finally:
+        with _local_state_condition:
+            _local_state_users -= 1
+            _local_state_condition.notify_all()
+
+
+class UnifyExecutor:
+    """Process pool which lives for a batch or the whole process.
+
+    Workers are started once and preload PRELOAD_MODULES. Stage specific
+    initializers run at most once per worker and state, so consecutive stages
+    and Unify instances with equal state skip fork and initializer costs.
+    Initializer arguments are only sent with chunks until every worker
+    reported holding the state.
+    Pass an instance via params["executor"] to use it for a run.
+
+    Each map call runs inline, in threads or in the process pool. In "auto"
+    mode the choice depends on the estimated workload, see select_mode.
+    """
+
+    def __init__(self, max_workers=None, preload=PRELOAD_MODULES, mode="auto"):
+        """Initialize executor, workers are started on first use.
+
+        Args:
+            max_workers (int, optional): number of worker processes
+            preload (iterable, optional): modules imported in every worker
+            mode (str, optional): default execution mode, one of EXECUTION_MODES
+        """
+        if max_workers is None:
+            max_workers = default_worker_count()
+        self.max_workers = max(1, max_workers)
+        self.preload = tuple(preload)
+        self.mode = self._check_mode(mode)
+        self._pool = None
+        self._pool_size = 0
+        self._threads = None
+        self._lock = threading.Lock()
+        # State key to pids of workers holding that state
+        self._state_workers = {}
+        self._state_lock = threading.Lock()
+
+    def __enter__(self):
+        """Start workers."""
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        """Shut workers down."""
+        self.shutdown()
+
+    def start(self):
+        """Start and warm up workers if they are not running yet.
+
+        Returns:
+            pool (multiprocessing.pool.Pool): worker pool
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool_size = min(self.max_workers, get_concurrency_limit())
+                self._pool = mp.Pool(
+                    self._pool_size,
+                    initializer=_warm_worker,
+                    initargs=(self.preload,),
+                )
+                self._state_workers = {}
+            return self._pool
+
+    def shutdown(self):
+        """Terminate workers, the executor can be restarted afterwards."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+            if self._threads is not None:
+                self._threads.shutdown()
+                self._threads = None
+
+    @staticmethod
+    def _check_mode(mode):
+        """Validate an execution mode.
+
+        Args:
+            mode (str): execution mode
+
+        Returns:
+            mode (str): execution mode
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(
+                f"Unknown execution mode {mode}, use one of {EXECUTION_MODES}."
+            )
+        return mode
+
+    def select_mode(self, workload, mode=None):
+        """Select how a stage is executed.
+
+        Args:
+            workload (float): estimated cost, number of items times cost per item
+            mode (str, optional): override of the executor mode
+
+        Returns:
+            mode (str): "inline", "thread" or "process"
+        """
+        if mode is None:
+            mode = self.mode
+        mode = self._check_mode(mode)
+        if mode != "auto":
+            return mode
+        if self.max_workers == 1 or workload < INLINE_MAX_COST:
+            return "inline"
+        if workload < THREAD_MAX_COST:
+            return "thread"
+        return "process"
+
+    def map(
+        self,
+        func,
+        iterable,
+        initializer=None,
+        initargs=(),
+        chunksize=None,
+        cost=SPECTRUM_COST,
+        mode=None,
+        progress=None,
+    ):
+        """Apply func to every item.
+
+        Args:
+            func (callable): picklable function
+            iterable (iterable): items
+            initializer (callable, optional): called with initargs in a worker
+                before it processes items of this state
+            initargs (tuple, optional): arguments of initializer
+            chunksize (int, optional): items per task
+            cost (float, optional): estimated cost per item
+            mode (str, optional): override of the executor mode
+            progress (tqdm, optional): progress bar advanced by the number of
+                items of each completed chunk
+
+        Returns:
+            list: results in item order
+        """
+        return self._map(
+            func,
+            iterable,
+            initializer,
+            initargs,
+            chunksize,
+            cost,
+            mode,
+            "item",
+            progress,
+        )
+
+    def starmap(
+        self,
+        func,
+        iterable,
+        initializer=None,
+        initargs=(),
+        chunksize=None,
+        cost=SPECTRUM_COST,
+        mode=None,
+        progress=None,
+    ):
+        """Apply func to every argument tuple.
+
+        Args:
+            func (callable): picklable function
+            iterable (iterable): argument tuples
+            initializer (callable, optional): called with initargs in a worker
+                before it processes items of this state
+            initargs (tuple, optional): arguments of initializer
+            chunksize (int, optional): items per task
+            cost (float, optional): estimated cost per item
+            mode (str, optional): override of the executor mode
+            progress (tqdm, optional): progress bar advanced by the number of
+                items of each completed chunk
+
+        Returns:
+            list: results in item order
+        """
+        return self._map(
+            func,
+            iterable,
+            initializer,
+            initargs,
+            chunksize,
+            cost,
+            mode,
+            "star",
+            progress,
+        )
+
+    def map_batches(
+        self,
+        func,
+        iterable,
+        initializer=None,
+        initargs=(),
+        batch_size=None,
+        cost=SPECTRUM_COST,
+        mode=None,
+        progress=None,
+    ):
+        """Apply func once to every contiguous batch of items.
+
+        Each task carries one batch and returns one result block, so per item
+        pickling and IPC overhead is paid once per batch.
+
+        Args:
+            func (callable): picklable function called with a list of items
+            iterable (iterable): items
+            initializer (callable, optional): called with initargs in a worker
+                before it processes items of this state
+            initargs (tuple, optional): arguments of initializer
+            batch_size (int, optional): items per batch, sized by
+                auto_batch_size if None
+            cost (float, optional): estimated cost per item
+            mode (str, optional): override of the executor mode
+            progress (tqdm, optional): progress bar advanced by the number of
+                items of each completed chunk
+
+        Returns:
+            list: results of func in batch order
+        """
+        return self._map(
+            func,
+            iterable,
+            initializer,
+            initargs,
+            batch_size,
+            cost,
+            mode,
+            "batch",
+            progress,
+        )
+
+    def imap_batches(
+        self,
+        func,
+        batches,
+        initializer=None,
+        initargs=(),
+        workload=None,
+        mode=None,
+        batched=False,
+        progress=None,
+    ):
+        """Apply func to every item of lazily produced batches.
+
+        Batches are consumed while earlier batches are processed and at most a
+        few batches per concurrency slot are in flight, so memory stays bounded
+        for inputs of any size.
+
+        Args:
+            func (callable): picklable function
+            batches (iterable): lists of items
+            initializer (callable, optional): called with initargs in a worker
+                before it processes items of this state
+            initargs (tuple, optional): arguments of initializer
+            workload (float, optional): estimated total cost, unknown workloads
+                are treated as large
+            mode (str, optional): override of the executor mode
+            batched (bool, optional): call func once per batch with all its
+                items instead of once per item
+            progress (tqdm, optional): progress bar advanced by the number of
+                items of each completed chunk
+
+        Yields:
+            list: results of one batch in item order, the result of func if
+                batched
+        """
+        if workload is None:
+            workload = float("inf")
+        yield from self._iter_chunk_results(
+            func,
+            batches,
+            initializer,
+            initargs,
+            self.select_mode(workload, mode=mode),
+            "batch" if batched is True else "item",
+            progress,
+        )
+
+    def _map(
+        self,
+        func,
+        iterable,
+        initializer,
+        initargs,
+        chunksize,
+        cost,
+        mode,
+        call,
+        progress,
+    ):
+        """Split items into chunks and run them as selected by select_mode."""
+        items = list(iterable)
+        if len(items) == 0:
+            return []
+        mode = self.select_mode(len(items) * cost, mode=mode)
+        if chunksize is None:
+            chunksize = auto_batch_size(len(items), self.max_workers)
+        chunks = (items[i : i + chunksize] for i in range(0, len(items), chunksize))
+        results = self._iter_chunk_results(
+            func, chunks, initializer, initargs, mode, call, progress
+        )
+        if call == "batch":
+            return list(results)
+        return list(chain.from_iterable(results))
+
+    def _iter_chunk_results(
+        self, func, chunks, initializer, initargs, mode, call, progress=None
+    ):
+        """Run chunks inline, in threads or in the process pool.
+
+        Args:
+            func (callable): picklable function
+            chunks (iterable): lists of items
+            initializer (callable): state initializer or None
+            initargs (tuple): arguments of initializer
+            mode (str): "inline", "thread" or "process"
+            call (str): how func is applied, see _run_chunk
+            progress (tqdm, optional): progress bar advanced per completed chunk
+
+        Yields:
+            list: results of one chunk in item order, see _run_chunk
+        """
+        if progress is not None:
+            sizes = deque()
+            results = self._iter_chunk_results(
+                func, _record_sizes(chunks, sizes), initializer, initargs, mode, call
+            )
+            for result in results:
+                progress.update(sizes.popleft())
+                yield result
+            return
+
+        key = None
+        if initializer is not None:
+            key = hashlib.sha1(pickle.dumps((initializer, initargs))).hexdigest()
+        if mode == "process":
+            yield from self._iter_pool_results(
+                func, chunks, key, (initializer, initargs), call
+            )
+            return
+
+        with _local_state(key, initializer, initargs):
+            if mode == "inline":
+                for chunk in chunks:
+                    yield _run_chunk(func, chunk, call)
+                return
+            with self._lock:
+                if self._threads is None:
+                    self._threads = ThreadPoolExecutor(self.max_workers)
+            threads = self._threads
+
+            def _submit(chunk, release):
+                future = threads.submit(_run_chunk, func, chunk, call)
+                future.add_done_callback(lambda _: release())
+                return future
+
+            yield from self._iter_limited(
+                _submit, chunks, lambda future: future.result()
+            )
+
+    def _iter_pool_results(self, func, chunks, key, payload, call):
+        """Run chunks in the process pool, sending state only where it is missing.
+
+        Args:
+            func (callable): picklable function
+            chunks (iterable): lists of items
+            key (str): state key, None if func needs no state
+            payload (tuple): initializer and initargs
+            call (str): how func is applied, see _run_chunk
+
+        Yields:
+            list: results of one chunk in item order, see _run_chunk
+        """
+        pool = self.start()
+        with self._state_lock:
+            holders = self._state_workers.setdefault(key, set())
+
+        def _submit(chunk, release):
+            with self._state_lock:
+                known = key is None or len(holders) >= self._pool_size
+            state = (key, None if known else payload)
+            result = pool.apply_async(
+                _run_pool_chunk,
+                (state, func, chunk, call),
+                callback=lambda _: release(),
+                error_callback=lambda _: release(),
+            )
+            return chunk, result
+
+        def _get_result(submission):
+            chunk, result = submission
+            pid, chunk_result = result.get()
+            if isinstance(chunk_result, _MissingState):
+                pid, chunk_result = pool.apply(
+                    _run_pool_chunk, ((key, payload), func, chunk, call)
+                )
+            if key is not None:
+                # Workers hold the state of the last chunk they processed
+                with self._state_lock:
+                    for other_key, pids in self._state_workers.items():
+                        if other_key != key:
+                            pids.discard(pid)
+                    holders.add(pid)
+            return chunk_result
+
+        yield from self._iter_limited(_submit, chunks, _get_result)
+
+    @staticmethod
+    def _iter_limited(submit, chunks, get_result):
+        """Submit chunks while holding one process-wide slot per running chunk.
+
+        Args:
+            submit (callable): submits a chunk, called with chunk and a release
+                callback which must be called once the chunk is done
+            chunks (iterable): chunks, consumed lazily
+            get_result (callable): waits for and returns the result of a submission
+
+        Yields:
+            list: results of one chunk, in chunk order
+        """
+        limit = get_concurrency_limit()
+        slots = _slots
+        pending = deque()
+        for chunk in chunks:
+            while len(pending) >= 2 * limit:
+                yield get_result(pending.popleft())
+            slots.acquire()
+            try:
+                pending.append(submit(chunk, slots.release))
+            except Exception:
+                slots.release()
+                raise
+        while len(pending) > 0:
+            yield get_result(pending.popleft())
+
+
+def get_executor(params=None):
+    """Return the executor passed in params or a process-wide default executor.
+
+    Default executors are created once per worker count and shut down at exit.
+
+    Args:
+        params (dict, optional): ursgal param dict, may contain "executor", "cpus"
+            and "execution_mode"
+
+    Returns:
+        executor (UnifyExecutor): executor
+    """
+    if params is None:
+        params = {}
+    executor = params.get("executor", None)
+    if executor is not None:
+        return executor
+    max_workers = params.get("cpus", default_worker_count())
+    with _executors_lock:
+        if max_workers not in _executors:
+            _executors[max_workers] = UnifyExecutor(max_workers=max_workers)
+    return _executors[max_workers]
+
+
+@atexit.register
+def _shutdown_executors():
+    """Shut down default executors at interpreter exit."""
+    for executor in _executors.values():
+        executor.shutdown()
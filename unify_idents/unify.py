@@ -1,10 +1,125 @@
 """Unify handler."""
-from importlib import import_module
+import inspect
+from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
+from unify_idents.engine_parsers.registry import (
+    get_parser_candidates,
+    get_parser_registry,
+)
+from unify_idents.utils import file_fingerprint, open_input
 
-from unify_idents.engine_parsers.base_parser import BaseParser
+HEADER_BYTES = 65536
+
+
+class FileHeader:
+    """Leading bytes of an input file, shared by all parser compatibility checks.
+
+    Attributes:
+        file (Path): path to input file
+        data (bytes): leading bytes of the file
+        text (str): decoded leading bytes
+        format (str): format detected from content, None if unknown
+        truncated (bool): True if the file is longer than the header
+    """
+
+    def __init__(self, file, data, truncated=False):
+        """Initialize header.
+
+        Args:
+            file (Path): path to input file
+            data (bytes): leading bytes of the file
+            truncated (bool, optional): True if the file is longer than data
+        """
+        self.file = file
+        self.data = data
+        self.truncated = truncated
+        self.text = data.decode("utf-8", errors="replace")
+        self._lines = self.text.splitlines(keepends=True)
+        self.format = detect_format(self.text)
+
+    def lines(self, n):
+        """Return the first n lines of the file.
+
+        Args:
+            n (int): number of lines
+
+        Returns:
+            str: joined lines, empty if the file has less than n lines
+        """
+        if len(self._lines) < n and not self.truncated:
+            return ""
+        return "".join(self._lines[:n])
+
+
+def detect_format(text):
+    """Detect file format from content.
+
+    Args:
+        text (str): leading part of a file
+
+    Returns:
+        str: one of "mzid", "xml", "mascot_dat", "tsv" and "csv", None if unknown
+    """
+    stripped = text.lstrip("\ufeff \t\r\n")
+    if stripped.startswith("<"):
+        return "mzid" if "<MzIdentML" in stripped else "xml"
+    if stripped.startswith("MIME-Version") or "application/x-Mascot" in stripped:
+        return "mascot_dat"
+    table_lines = [l for l in stripped.splitlines() if not l.startswith("#")]
+    if len(table_lines) == 0:
+        return None
+    if "\t" in table_lines[0]:
+        return "tsv"
+    if "," in table_lines[0]:
+        return "csv"
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _read_header(file, size, mtime_ns):
+    """Read file header once per file fingerprint.
+
+    Args:
+        file (Path): resolved path to input file
+        size (int): file size in bytes
+        mtime_ns (int): modification time in nanoseconds
+
+    Returns:
+        FileHeader: header of the file
+    """
+    with open_input(file) as f:
+        data = f.read(HEADER_BYTES + 1)
+    return FileHeader(file, data[:HEADER_BYTES], truncated=len(data) > HEADER_BYTES)
+
+
+def sniff_file(file):
+    """Read the header of a file, cached by path, size and modification time.
+
+    Args:
+        file (str or Path): path to input file
+
+    Returns:
+        FileHeader: header of the file
+    """
+    return _read_header(*file_fingerprint(file))
+
+
+@lru_cache(maxsize=16)
+def _read_immutable_peptides(file, size, mtime_ns):
+    """Read immutable peptides once per file fingerprint.
+
+    Args:
+        file (Path): resolved path to file with immutable peptides
+        size (int): file size in bytes
+        mtime_ns (int): modification time in nanoseconds
+
+    Returns:
+        tuple: immutable peptides
+    """
+    import pandas as pd
+
+    return tuple(pd.read_csv(file, header=None).iloc[:, 0].to_list())
 
 
 class Unify:
@@ -30,8 +145,8 @@ class Unify:
         self.params = params
 
         if immutable_peptides is not None:
-            self.immutable_peptides = (
-                pd.read_csv(immutable_peptides, header=None).iloc[:, 0].to_list()
+            self.immutable_peptides = list(
+                _read_immutable_peptides(*file_fingerprint(immutable_peptides))
             )
         else:
             self.immutable_peptides = None
@@ -43,28 +158,24 @@ class Unify:
     def _get_parser(self):
         """Check input file / parser compatibility and init matching parser in self.parser.
 
+        The file header is read once and shared by all compatibility checks.
+        Only parsers whose registration fits the header are imported.
         Raises error if no matching parser can be found.
         """
-        # Get all files except __init__.pys
-        parser_files = (Path(__file__).parent / "engine_parsers").rglob("[!_]*.py")
-        # Make paths relative to package
-        parser_files = [
-            p.relative_to(Path(__file__).parent.parent).as_posix() for p in parser_files
-        ]
-        # Format and filter for relevant subdirectories
-        parser_files = [
-            p.replace(".py", "").replace("/", ".")
-            for p in parser_files
-            if p.count("/") == 3
-        ]
-        for parser in parser_files:
-            import_module(parser)
-
-        for cat in BaseParser.__subclasses__():
-            self._parser_classes.extend(cat.__subclasses__())
-
-        for parser in self._parser_classes:
-            if parser.check_parser_compatibility(self.input_file) is True:
+        self._parser_classes = list(get_parser_registry().values())
+        header = sniff_file(self.input_file)
+        for entry in get_parser_candidates(self.input_file, header=header):
+            parser = entry.load()
+            if (
+                "header"
+                in inspect.signature(parser.check_parser_compatibility).parameters
+            ):
+                compatible = parser.check_parser_compatibility(
+                    self.input_file, header=header
+                )
+            else:
+                compatible = parser.check_parser_compatibility(self.input_file)
+            if compatible is True:
                 return parser(
                     input_file=self.input_file,
                     params=self.params,
@@ -83,3 +194,90 @@ class Unify:
         self.df = self.parser.unify()
 
         return self.df
+
+
+def warm_shared_resources(params, immutable_peptides=None):
+    """Build the process-wide resources a run with these params attaches to.
+
+    Loads the unimod mapper, the peptide mapper of params["database"], the
+    meta info lookup of params["rt_pickle_name"] and the immutable peptide
+    automaton, each only if it is not cached yet.
+
+    Args:
+        params (dict): ursgal param dict
+        immutable_peptides (str, optional): path to file with immutable peptides
+    """
+    from unify_idents.engine_parsers.ident.ident_base_parser import (
+        RT_TRUNCATE_PRECISION,
+    )
+    from unify_idents.engine_parsers.misc import (
+        get_peptide_automaton,
+        get_peptide_mapper,
+        get_unimod_mapper,
+        read_meta_info_lookup,
+    )
+
+    get_unimod_mapper(params.get("xml_file_list", None))
+    if params.get("database", None) is not None:
+        get_peptide_mapper(params["database"])
+    if params.get("rt_pickle_name", None) is not None:
+        read_meta_info_lookup(params["rt_pickle_name"], RT_TRUNCATE_PRECISION)
+    if immutable_peptides is not None:
+        get_peptide_automaton(
+            _read_immutable_peptides(*file_fingerprint(immutable_peptides))
+        )
+
+
+def unify_batch(
+    input_files, params, immutable_peptides=None, combine=False, max_workers=None
+):
+    """Unify several engine outputs with one set of params and shared resources.
+
+    Shared resources are built once by warm_shared_resources before the files
+    are processed concurrently. All files share params["executor"], or an
+    executor which lives for the batch.
+
+    Args:
+        input_files (list): paths to input files
+        params (dict): ursgal param dict used for all files
+        immutable_peptides (str, optional): path to file with immutable peptides
+        combine (bool, optional): return one concatenated dataframe
+        max_workers (int, optional): number of files processed concurrently
+
+    Returns:
+        dict or pd.DataFrame: unified dataframe per input file or combined dataframe
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pandas as pd
+
+    from unify_idents.executor import UnifyExecutor
+
+    input_files = [Path(f) for f in input_files]
+    warm_shared_resources(params, immutable_peptides=immutable_peptides)
+
+    params = params.copy()
+    batch_executor = None
+    if params.get("executor", None) is None:
+        batch_executor = UnifyExecutor(max_workers=params.get("cpus", None))
+        params["executor"] = batch_executor
+    # Fork workers before any file threads are running
+    params["executor"].start()
+
+    def _unify_file(input_file):
+        return Unify(
+            input_file, params.copy(), immutable_peptides=immutable_peptides
+        ).get_dataframe()
+
+    if max_workers is None:
+        max_workers = len(input_files)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            dfs = dict(zip(input_files, executor.map(_unify_file, input_files)))
+    finally:
+        if batch_executor is not None:
+            batch_executor.shutdown()
+
+    if combine is True:
+        return pd.concat(dfs.values(), axis=0, ignore_index=True)
+    return dfs
@@ -1,4 +1,172 @@
 """Collection of utils."""
+import bz2
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Compressed inputs are recognized by suffix and decompressed while reading
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd"}
+
+
+def get_cache_dir():
+    """Return directory for persistent caches, creating it if needed.
+
+    Uses $UNIFY_IDENTS_CACHE_DIR if set, else $XDG_CACHE_HOME/unify_idents or
+    ~/.cache/unify_idents.
+
+    Returns:
+        cache_dir (Path): cache directory
+
+    Raises:
+        OSError: if the directory cannot be determined or created
+    """
+    cache_dir = os.environ.get("UNIFY_IDENTS_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.environ.get("XDG_CACHE_HOME")
+        if cache_dir is None:
+            try:
+                cache_dir = Path.home() / ".cache"
+            except (KeyError, RuntimeError) as e:
+                raise OSError(f"No home directory for the cache: {e}") from e
+        cache_dir = Path(cache_dir) / "unify_idents"
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def write_cache_file(cache_file, write, mode="wb"):
+    """Atomically replace a cache file, giving up on any OSError.
+
+    Caches are best effort, the cache directory may be read-only or full.
+
+    Args:
+        cache_file (Path): path to cache file
+        write (callable): called with the open temporary file
+        mode (str, optional): "wb" or "w"
+
+    Returns:
+        bool: True if the cache file was written
+    """
+    f = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            mode, dir=cache_file.parent, prefix=cache_file.name, delete=False
+        ) as f:
+            write(f)
+        os.replace(f.name, cache_file)
+    except OSError:
+        if f is not None:
+            try:
+                os.unlink(f.name)
+            except OSError:
+                pass
+        return False
+    return True
+
+
+def get_compression(file):
+    """Return the compression of a file, judged by its suffix.
+
+    The names match the compression argument of pd.read_csv.
+
+    Args:
+        file (str or Path): path to file
+
+    Returns:
+        str: "gzip", "bz2" or "zstd", None if uncompressed
+    """
+    return COMPRESSION_SUFFIXES.get(Path(file).suffix.lower(), None)
+
+
+def input_suffix(file):
+    """Return the suffix of a file, ignoring a compression suffix.
+
+    Args:
+        file (str or Path): path to file
+
+    Returns:
+        str: lower case suffix, e.g. ".mzid" for "BSA1.mzid.gz"
+    """
+    file = Path(file)
+    if get_compression(file) is not None:
+        file = file.with_suffix("")
+    return file.suffix.lower()
+
+
+def open_input(file, mode="rb", encoding=None):
+    """Open a possibly compressed input file with streaming decompression.
+
+    Args:
+        file (str or Path): path to file
+        mode (str, optional): "rb" or "rt"
+        encoding (str, optional): encoding in text mode
+
+    Returns:
+        file object: readable file object
+    """
+    compression = get_compression(file)
+    if compression == "gzip":
+        f = gzip.open(file, "rb")
+    elif compression == "bz2":
+        f = bz2.open(file, "rb")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                f"Reading {file} requires zstandard, install unify_idents[zstd]."
+            ) from e
+        f = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), closefd=True)
+        )
+    else:
+        f = open(file, "rb")
+    if "t" in mode:
+        return io.TextIOWrapper(f, encoding=encoding)
+    return f
+
+
+def file_fingerprint(file):
+    """Identify a file version by path, size and modification time.
+
+    Args:
+        file (str or Path): path to file
+
+    Returns:
+        tuple: resolved path, size in bytes and modification time in nanoseconds
+    """
+    file = Path(file).resolve()
+    stat = file.stat()
+    return file, stat.st_size, stat.st_mtime_ns
+
+
+def hash_file_contents(files, salt=""):
+    """Compute a digest over the contents of several files.
+
+    Missing files only contribute their name.
+
+    Args:
+        files (list): paths to files, order matters
+        salt (str, optional): additional string mixed into the digest
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256(salt.encode())
+    for file in files:
+        file = Path(file)
+        digest.update(file.name.encode())
+        if not file.exists():
+            continue
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
 
 
 def merge_and_join_dicts(list_of_dicts, delimiter):
@@ -16,3 +184,24 @@ def merge_and_join_dicts(list_of_dicts, delimiter):
         key: delimiter.join([str(d.get(key)) for d in list_of_dicts])
         for key in set().union(*list_of_dicts)
     }
+
+
+def join_consecutive(keys, values, delimiter):
+    """Join the string values of runs of equal consecutive keys.
+
+    Args:
+        keys (array-like): group keys, equal keys must be adjacent
+        values (array-like): strings to join
+        delimiter (str): delimiter
+
+    Returns:
+        tuple: np.ndarray of keys of the runs and list of joined strings
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, dtype=object)
+    if len(keys) == 0:
+        return keys, []
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    joined = [delimiter.join(values[start:end]) for start, end in zip(starts, ends)]
+    return keys[starts], joined